@@ -0,0 +1,25 @@
+"""Timing helpers shared by the benchmark scripts."""
+
+import time
+import statistics
+
+
+def report(name, samples):
+    """Prints the sample count, median and p99 of samples (seconds)."""
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{name:<32} n={len(samples):<5} "
+        f"p50={statistics.median(samples) * 1000:10.3f} ms  "
+        f"p99={p99 * 1000:10.3f} ms"
+    )
+
+
+async def timed(func, iterations):
+    """Awaits func() iterations times. Returns the duration of each call."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started)
+    return samples
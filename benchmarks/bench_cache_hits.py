@@ -0,0 +1,81 @@
+"""
+Cache hit latency: zero-network index lookup vs. the yt-dlp probe.
+
+Seeds a cached TikTok video and its short-code alias in a scratch
+directory, then times:
+  - find_cached_video (alias table + stat, what hits use now)
+  - a full GET of the short code through the app
+  - _find_cached_tiktok_video (yt-dlp extract_info, what hits used before)
+
+The probe needs network access to TikTok; without it that row reports the
+error instead of a timing.
+
+Usage: python benchmarks/bench_cache_hits.py [tiktok_short_code video_id]
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from _util import report, timed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHORT_CODE = "ZNd5tth8o"
+VIDEO_ID = "7498636088018210070"
+FAST_ITERATIONS = 2000
+HTTP_ITERATIONS = 300
+PROBE_ITERATIONS = 3
+
+
+async def run(short_code, video_id):
+    import httpx
+    import main
+    from services.AliasService import AliasService
+    from services.YtdlpService import YtdlpService
+
+    with open(main.video_path("t", video_id), "wb") as f:
+        f.write(os.urandom(2 * 1024 * 1024))
+    await AliasService.remember("t", short_code, video_id)
+
+    async def lookup():
+        assert await main.find_cached_video("t", short_code)
+
+    report("find_cached_video", await timed(lookup, FAST_ITERATIONS))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+
+        async def get():
+            response = await c.get(f"/{short_code}")
+            assert response.status_code == 200
+
+        report("GET /<short_code> (hit)", await timed(get, HTTP_ITERATIONS))
+
+    url = main.get_tiktok_url(short_code)
+    YtdlpService.start()
+    try:
+
+        async def probe():
+            _, info_dict = await main._find_cached_tiktok_video(url)
+            if info_dict is None:
+                raise RuntimeError("extract_info returned nothing (no network?)")
+
+        report("yt-dlp probe (previous hit path)", await timed(probe, PROBE_ITERATIONS))
+    except Exception as e:
+        print(f"{'yt-dlp probe (previous hit path)':<32} unavailable: {e}")
+    finally:
+        YtdlpService.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        short_code, video_id = sys.argv[1:3]
+    else:
+        short_code, video_id = SHORT_CODE, VIDEO_ID
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as scratch:
+        # One client hammering one route would otherwise be throttled
+        os.environ["RATE_LIMIT_ENABLED"] = "0"
+        os.environ["INDEX_DB_PATH"] = os.path.join(scratch, "videos", "index.sqlite3")
+        os.chdir(scratch)
+        asyncio.run(run(short_code, video_id))
@@ -0,0 +1,141 @@
+"""
+Cache layout at scale: flat platform directory vs. sharded one.
+
+Fills a scratch directory with N empty-but-sized video files (default
+1,000,000) twice, once flat (t/<id>.mp4) and once sharded
+(t/ab/cd/<id>.mp4), indexes the sharded copy, then times:
+  - a cache lookup (stat of a random video) in each layout
+  - IndexService.get for a random video, bypassing the mirror
+  - picking the next eviction batch: listing and sorting the flat
+    directory, as the old sweeper did, vs. IndexService.coldest
+
+Files are sparse, so the run needs inodes rather than disk space.
+
+Usage: python benchmarks/bench_cache_layout.py [files]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from _util import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILES = 1_000_000
+FILE_SIZE = 2048
+LOOKUPS = 5000
+EVICTIONS = 3
+
+
+def create(path):
+    with open(path, "wb") as f:
+        f.truncate(FILE_SIZE)
+
+
+def fill(files):
+    from services.CacheService import CacheService
+
+    flat_dir = os.path.join("flat", "t")
+    sharded_dir = os.path.join("videos", "t")
+    os.makedirs(flat_dir)
+    now = time.time()
+    entries = []
+    started = time.perf_counter()
+    for n in range(files):
+        video_id = str(7_000_000_000_000_000_000 + n)
+        create(os.path.join(flat_dir, f"{video_id}.mp4"))
+        shard_dir = os.path.join(sharded_dir, CacheService.shard(video_id))
+        os.makedirs(shard_dir, exist_ok=True)
+        path = os.path.join(shard_dir, f"{video_id}.mp4")
+        create(path)
+        entries.append((video_id, path, FILE_SIZE, now - files + n))
+    print(f"created 2 x {files} files in {time.perf_counter() - started:.1f} s")
+    return flat_dir, sharded_dir, entries
+
+
+def flat_coldest(directory, limit):
+    found = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            st = entry.stat()
+            found.append((max(st.st_atime, st.st_mtime), entry.path))
+    found.sort()
+    return found[:limit]
+
+
+async def run(files):
+    from services.CacheService import CacheService
+    from services.IndexService import IndexService
+
+    flat_dir, sharded_dir, entries = fill(files)
+    started = time.perf_counter()
+    for n in range(0, len(entries), 10000):
+        await IndexService.found("t", entries[n : n + 10000])
+    print(f"indexed {files} files in {time.perf_counter() - started:.1f} s")
+
+    ids = [random.choice(entries)[0] for _ in range(LOOKUPS)]
+
+    def timed(func):
+        samples = []
+        for video_id in ids:
+            started = time.perf_counter()
+            func(video_id)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    report(
+        "lookup, flat",
+        timed(lambda v: os.stat(os.path.join(flat_dir, f"{v}.mp4"))),
+    )
+    report(
+        "lookup, sharded",
+        timed(
+            lambda v: os.stat(
+                os.path.join(sharded_dir, CacheService.shard(v), f"{v}.mp4")
+            )
+        ),
+    )
+    report("index row, sqlite", timed(lambda v: IndexService._select("t", v)))
+
+    samples = []
+    for _ in range(EVICTIONS):
+        started = time.perf_counter()
+        flat_coldest(flat_dir, CacheService.EVICT_BATCH)
+        samples.append(time.perf_counter() - started)
+    report("eviction batch, flat scan", samples)
+
+    samples = []
+    for _ in range(LOOKUPS // 10):
+        started = time.perf_counter()
+        await IndexService.coldest("t", time.time(), CacheService.EVICT_BATCH)
+        samples.append(time.perf_counter() - started)
+    report("eviction batch, index", samples)
+
+    samples = []
+    for _ in range(EVICTIONS):
+        started = time.perf_counter()
+        await IndexService.usage()
+        samples.append(time.perf_counter() - started)
+    report("usage, index", samples)
+
+    samples = []
+    for _ in range(EVICTIONS):
+        started = time.perf_counter()
+        for first_shard in range(0, 256, CacheService.WALK_SHARDS):
+            CacheService._walk("t", first_shard)
+        samples.append(time.perf_counter() - started)
+    report("full shard walk (thread time)", samples)
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory(dir=os.environ.get("BENCH_DIR")) as scratch:
+        os.environ["INDEX_DB_PATH"] = os.path.join(scratch, "videos", "index.sqlite3")
+        os.chdir(scratch)
+        from services.CacheService import CacheService
+
+        CacheService._directories = {"t": os.path.join("videos", "t")}
+        asyncio.run(run(files))
@@ -0,0 +1,78 @@
+"""
+YouTube duration check: watch-page probe vs. yt-dlp extraction.
+
+Times, for one video:
+  - YoutubeService.probe (one watch page fetch, regex parse)
+  - a full yt-dlp extraction, what get_duration used before
+  - parsing alone, on a synthetic watch page the size of a real one
+
+The first two need network access to YouTube; without it those rows
+report the error instead of a timing.
+
+Usage: python benchmarks/bench_youtube_probe.py [video_id]
+"""
+
+import os
+import sys
+import asyncio
+from _util import report, timed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIDEO_ID = "dQw4w9WgXcQ"
+NETWORK_ITERATIONS = 5
+PARSE_ITERATIONS = 200
+
+
+def synthetic_page(video_id):
+    player = (
+        '{"playabilityStatus":{"status":"OK","playableInEmbed":true},'
+        f'"videoDetails":{{"videoId":"{video_id}","title":"t",'
+        '"lengthSeconds":"212","isLiveContent":false}}'
+    )
+    related = '{"videoId":"x","lengthSeconds":"99"},' * 2000
+    filler = "<script>var x = 1;</script>" * 30000
+    return f"<html>{filler}var ytInitialPlayerResponse = {player};[{related}]</html>"
+
+
+async def run(video_id):
+    from services.YoutubeService import YoutubeService
+    from services.YtdlpService import YtdlpService
+    from services.HttpClientService import HttpClientService
+
+    html = synthetic_page(video_id)
+
+    async def parse():
+        YoutubeService._parse_watch_page(html, video_id)
+
+    report(
+        f"parse ({len(html) // 1024} KiB page)", await timed(parse, PARSE_ITERATIONS)
+    )
+
+    async def probe():
+        await YoutubeService.probe(video_id)
+
+    try:
+        report("watch-page probe", await timed(probe, NETWORK_ITERATIONS))
+    except Exception as e:
+        print(f"{'watch-page probe':<32} unavailable: {e}")
+
+    YtdlpService.start()
+    # Every iteration must extract, not hit the metadata cache
+    YtdlpService.METADATA_TTL = 0
+    try:
+
+        async def extract():
+            await YoutubeService._get_video_info_yt_dlp(video_id)
+
+        report("yt-dlp extraction (previous)", await timed(extract, NETWORK_ITERATIONS))
+    except Exception as e:
+        print(f"{'yt-dlp extraction (previous)':<32} unavailable: {e}")
+    finally:
+        YtdlpService.shutdown()
+        await HttpClientService.aclose()
+
+
+if __name__ == "__main__":
+    video_id = sys.argv[1] if len(sys.argv) > 1 else VIDEO_ID
+    sys.path.insert(0, ROOT)
+    asyncio.run(run(video_id))
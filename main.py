@@ -1,11 +1,13 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    FileResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 import os
 import re
-import yt_dlp
+import math
 import asyncio
-import time
-import requests
 from urllib.parse import parse_qs, urlparse
 from typing import Optional
 from services.InstagramService import InstagramService
@@ -13,7 +15,26 @@ from services.FacebookService import FacebookService
 from services.TiktokService import TiktokService
 from services.ThreadsService import ThreadsService
 from services.XService import XService
-from services.YoutubeService import YoutubeService
+from services.YoutubeService import (
+    YoutubeService,
+    VideoNotFoundError as YoutubeVideoNotFound,
+)
+from services.ExecutorService import ExecutorService
+from services.YtdlpService import YtdlpService
+from services.HttpClientService import HttpClientService
+from services.LoopMonitorService import LoopMonitorService
+from services.AdmissionService import AdmissionService
+from services.RateLimitService import RateLimitService
+from services.SingleFlightService import SingleFlightService
+from services.FileLockService import FileLockService
+from services.TeeService import TeeService
+from services.AliasService import AliasService
+from services.BlobStoreService import BlobStoreService
+from services.CacheService import CacheService
+from services.IndexService import IndexService
+from services.HotCacheService import HotCacheService, MemoryResponse
+from services.DirectUrlService import DirectUrlService
+from services.NegativeCacheService import NegativeCacheService
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -39,37 +60,70 @@ os.makedirs(VIDEO_DIR_I, exist_ok=True)
 os.makedirs(VIDEO_DIR_F, exist_ok=True)
 os.makedirs(VIDEO_DIR_H, exist_ok=True)
 os.makedirs(VIDEO_DIR_Y, exist_ok=True)
-
-
-async def delete_old_videos():
-    while True:
-        now = time.time()
-        # Check all five directories
-        for directory in [
-            VIDEO_DIR_T,
-            VIDEO_DIR_X,
-            VIDEO_DIR_I,
-            VIDEO_DIR_F,
-            VIDEO_DIR_H,
-            VIDEO_DIR_Y,
-        ]:
-            for filename in os.listdir(directory):
-                filepath = os.path.join(directory, filename)
-                if os.path.isfile(filepath):
-                    file_mtime = os.path.getmtime(filepath)
-                    # If file is older than 3 minutes (180 seconds), delete it
-                    if now - file_mtime > 180:
-                        try:
-                            os.remove(filepath)
-                            print(f"Deleted old video: {filename} from {directory}")
-                        except Exception as e:
-                            print(f"Error deleting file {filename}: {e}")
-        await asyncio.sleep(300)  # Sleep for 5 minutes
+VIDEO_DIRS = {
+    "t": VIDEO_DIR_T,
+    "x": VIDEO_DIR_X,
+    "i": VIDEO_DIR_I,
+    "f": VIDEO_DIR_F,
+    "h": VIDEO_DIR_H,
+    "y": VIDEO_DIR_Y,
+}
+_VIDEO_DIR_PLATFORMS = {os.path.normpath(d): p for p, d in VIDEO_DIRS.items()}
+
+
+def video_path(
+    platform: str, video_id: str, ext: str = "mp4", create: bool = True
+) -> str:
+    """
+    Where a video is cached: <platform dir>/ab/cd/<video_id>.<ext>, sharded
+    so no directory grows past a few thousand files. ext may be a yt-dlp
+    template field such as "%(ext)s". Creates the shard directory unless
+    create is False.
+    """
+    directory = os.path.join(VIDEO_DIRS[platform], CacheService.shard(video_id))
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{video_id}.{ext}")
+
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    prefix = RateLimitService.prefix_for(request.url.path)
+    if prefix is None:
+        return await call_next(request)
+
+    peer = request.client.host if request.client else None
+    client = RateLimitService.client_key(request.headers, peer)
+    # Lets the admission lanes queue this request fairly per client; the
+    # request is charged only if it goes upstream (RateLimitService.charge)
+    client_token = RateLimitService.current_client.set(client)
+    prefix_token = RateLimitService.current_prefix.set(prefix)
+    try:
+        return await call_next(request)
+    finally:
+        RateLimitService.current_prefix.reset(prefix_token)
+        RateLimitService.current_client.reset(client_token)
 
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(delete_old_videos())
+    LoopMonitorService.start()
+    YtdlpService.start()
+    CacheService.start(VIDEO_DIRS)
+    IndexService.start()
+    DirectUrlService.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    LoopMonitorService.stop()
+    CacheService.stop()
+    DirectUrlService.stop()
+    ExecutorService.shutdown()
+    YtdlpService.shutdown()
+    await HttpClientService.aclose()
+    await IndexService.stop()
+    AliasService.close()
 
 
 def get_tiktok_url(tiktok_id: str) -> str:
@@ -99,6 +153,22 @@ def get_tiktok_url(tiktok_id: str) -> str:
         return None
 
 
+def get_tiktok_video_url(video_id: str) -> str:
+    # Canonical URL for a numeric video ID; TikTok ignores the username
+    return f"https://www.tiktok.com/@_/video/{video_id}"
+
+
+async def resolve_tiktok_url(tiktok_id: str) -> Optional[str]:
+    """
+    Like get_tiktok_url, but forms with a known video ID go straight to
+    the canonical video URL, skipping the short link redirect.
+    """
+    video_id = await AliasService.canonical("t", tiktok_id)
+    if video_id is not None:
+        return get_tiktok_video_url(video_id)
+    return get_tiktok_url(tiktok_id)
+
+
 @app.get("/")
 async def form():
     # return FileResponse("web/index.html")
@@ -110,17 +180,226 @@ async def ping():
     return {"message": "pong"}  # Return a simple pong response
 
 
+@app.get("/stats")
+async def stats():
+    return {
+        "bulkheads": ExecutorService.stats(),
+        "event_loop": LoopMonitorService.stats(),
+        "admission": AdmissionService.stats(),
+        "rate_limit": RateLimitService.stats(),
+        "single_flight": SingleFlightService.stats(),
+        "file_locks": FileLockService.stats(),
+        "tee": TeeService.stats(),
+        "aliases": AliasService.stats(),
+        "blobs": BlobStoreService.stats(),
+        "cache": CacheService.stats(),
+        "index": IndexService.stats(),
+        "hot_cache": HotCacheService.stats(),
+        "direct_urls": DirectUrlService.stats(),
+        "negative_cache": NegativeCacheService.stats(),
+        "ytdlp": YtdlpService.stats(),
+    }
+
+
 @app.get("/favicon.ico")
 async def favicon():
     return FileResponse("web/favicon.png")
 
 
-async def download_tiktok_video_by_id(tiktok_id: str):
-    url = get_tiktok_url(tiktok_id)
-    print(f"Resolved TikTok URL: {url}")
-    if not url:
-        raise HTTPException(status_code=400, detail="Invalid TikTok ID format")
+async def resolve_video_url(platform: str, key: str, func, *args) -> str:
+    """
+    Resolves a direct video URL in the redirect lane. key is the video's ID
+    as requested. URLs are reused until shortly before they expire, and
+    concurrent requests for the same platform and key share a single
+    resolution, as does the background refresh of popular URLs.
+    """
+
+    async def resolve():
+        async with AdmissionService.lane("redirect"):
+            video_url = await func(*args)
+        await DirectUrlService.put(platform, key, video_url)
+        return video_url
+
+    async def refresh():
+        return await SingleFlightService.do((platform, "redirect", key), resolve)
+
+    video_url = await DirectUrlService.get(platform, key, refresh)
+    if video_url is not None:
+        return video_url
+    NegativeCacheService.check((platform, "redirect", key))
+    RateLimitService.charge()
+    try:
+        return await refresh()
+    except Exception as e:
+        NegativeCacheService.record((platform, "redirect", key), e)
+        raise
+
+
+def video_key(path: str) -> Optional[tuple]:
+    """(platform, video ID) of a cached file, or None if it is not one."""
+    directory = os.path.dirname(os.path.normpath(path))
+    # Sharded files sit two levels below their platform directory
+    platform = _VIDEO_DIR_PLATFORMS.get(
+        os.path.dirname(os.path.dirname(directory))
+    ) or _VIDEO_DIR_PLATFORMS.get(directory)
+    if platform is None:
+        return None
+    return platform, os.path.splitext(os.path.basename(path))[0]
+
+
+async def find_cached_video(platform: str, request_id: str) -> Optional[str]:
+    """
+    Zero-network cache lookup keyed by the request's own identifier. The
+    alias table maps the forms a video was requested as to the name it is
+    saved under, and the index maps that name to its file, so no
+    extraction is needed to find it. Runs in the never-shed hit lane.
+    Returns the cached path, or None on a miss.
+    """
+    async with AdmissionService.lane("hit"):
+        return await _find_cached_video(platform, request_id)
+
+
+async def _find_cached_video(platform: str, request_id: str) -> Optional[str]:
+    # Forms that contain the video ID need no alias
+    name = AliasService.parse(platform, request_id) or request_id
+    # Share IDs can take two hops: share ID -> video ID -> file name
+    for _ in range(3):
+        video = await IndexService.get(platform, name)
+        if video is not None and video.path:
+            paths = [video.path]
+        elif re.fullmatch(r"[\w-]+", name):
+            # Not indexed (or only its direct URL is); flat until the
+            # cache walker moves it
+            paths = [
+                video_path(platform, name, create=False),
+                os.path.join(VIDEO_DIRS[platform], f"{name}.mp4"),
+            ]
+        else:
+            paths = []
+        for path in paths:
+            try:
+                if os.path.getsize(path) > 1024:
+                    return path
+            except OSError:
+                # Evicted by another worker
+                pass
+        name = await AliasService.resolve(platform, name)
+        if name is None:
+            return None
+    return None
+
+
+async def _get_stored_video_file(func, *args):
+    """
+    Runs a download chain and adds its file to the cache, if admitted.
+    Returns (filename, whether it had to be downloaded).
+    """
+    filename, download = await CacheService.track_download(func, *args)
+    downloaded = download.path is not None
+    # Counts as an access even for requesters that streamed it, and keeps
+    # yt-dlp's upstream mtime from making a fresh file look stale
+    CacheService.touch(filename)
+    digest = download.digest
+    # Rejected downloads are on probation, stored later only if they
+    # prove popular enough
+    if not downloaded or CacheService.admit(filename, digest):
+        # yt-dlp output is hashed here; HTTP downloads were stored as they landed
+        digest = await BlobStoreService.ingest(filename) or digest
+    key = video_key(filename)
+    if key is not None:
+        await IndexService.put(
+            *key, filename, os.path.getsize(filename), digest, download.source
+        )
+    return filename, downloaded
+
+
+def cached_file_response(filename: str, hit: bool = True):
+    """
+    Serves a cached video, recording the access for eviction. Popular
+    small videos are served from memory.
+    """
+    filename = os.path.normpath(filename)
+    CacheService.touch(filename)
+    key = video_key(filename)
+    if hit and key is not None:
+        IndexService.accessed(*key)
+
+    video = HotCacheService.get(filename)
+    if video is not None:
+        CacheService.record(filename, hit, len(video.body))
+        return MemoryResponse(video, media_type="video/mp4")
+    CacheService.record(filename, hit)
+    HotCacheService.consider(filename)
+    return FileResponse(filename, media_type="video/mp4")
+
+
+async def serve_video(key, func, *args):
+    """
+    Runs the download flight for key and responds with the video. When
+    the download streams through HttpClientService, every requester gets
+    the bytes as they arrive instead of waiting for the whole file.
+    Videos that failed recently fail again right away.
+    """
+    NegativeCacheService.check(key)
+    RateLimitService.charge()
+
+    def settled(f):
+        # Streaming requesters never await the flight; keep its error retrieved
+        if not f.cancelled() and f.exception() is not None:
+            NegativeCacheService.record(key, f.exception())
+
+    flight = asyncio.ensure_future(
+        SingleFlightService.do_exclusive(
+            key, TeeService.run, key, _get_stored_video_file, func, *args
+        )
+    )
+    flight.add_done_callback(settled)
+
+    transfer = await TeeService.wait(key, flight)
+    if transfer is None:
+        filename, downloaded = await flight
+        return cached_file_response(filename, hit=not downloaded)
+
+    CacheService.record(transfer.final_path, hit=False)
+    headers = {}
+    if transfer.total is not None:
+        headers["Content-Length"] = str(transfer.total)
+    return StreamingResponse(
+        transfer.follow(), media_type="video/mp4", headers=headers
+    )
+
+
+def is_valid_video_file(filepath, min_size=1024):
+    """Check if file exists and has valid size for a video"""
+    if not os.path.exists(filepath):
+        return False
+    size = os.path.getsize(filepath)
+    print(f"File exists: {filepath}, size: {size} bytes")
+    return size > min_size
+
+
+async def _find_cached_tiktok_video(url: str):
+    """
+    Looks up a TikTok video in the cache.
+    Returns (filename, info_dict). filename is None on a miss and info_dict
+    is None when yt-dlp could not extract the video.
+    """
+    try:
+        info_dict = await YtdlpService.extract_info("tiktok", url)
+    except Exception as e:
+        print(f"yt-dlp method 1 failed: {e}")
+        return None, None
+
+    filename = video_path("t", info_dict.get("id"), info_dict.get("ext"), create=False)
+    if is_valid_video_file(filename):
+        return filename, info_dict
+    return None, info_dict
+
 
+async def _download_tiktok_video_file(
+    tiktok_id: str, url: str, info_dict: Optional[dict]
+) -> str:
+    """TikTok download chain for a cache miss. Returns the path of the video."""
     # Extract video_id from URL as fallback for when yt-dlp fails
     video_id = None
     url_match = re.search(r"tiktok\.com/(?:@[^/]+/)?video/(\d+)", url)
@@ -131,50 +410,27 @@ async def download_tiktok_video_by_id(tiktok_id: str):
     # Try multiple download methods
     last_error = None
 
-    # Check if file already exists with valid size
-    def is_valid_video_file(filepath, min_size=1024):
-        """Check if file exists and has valid size for a video"""
-        if not os.path.exists(filepath):
-            return False
-        size = os.path.getsize(filepath)
-        print(f"File exists: {filepath}, size: {size} bytes")
-        return size > min_size
-
     # Method 1: yt-dlp with TikTok-specific options
-    ydl_opts = {
-        "outtmpl": os.path.join(VIDEO_DIR_T, "%(id)s.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-        "extractor_retries": 3,
-        "fragment_retries": 3,
-        "skip_unavailable_fragments": False,
-        "nocheckcertificate": True,
-        "prefer_insecure": True,
-        "geo_bypass": True,
-    }
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            video_id = info_dict.get("id")
-            ext = info_dict.get("ext")
-            filename = os.path.join(VIDEO_DIR_T, f"{video_id}.{ext}")
-
-            if is_valid_video_file(filename):
-                return FileResponse(filename, media_type="video/mp4")
-
-            ydl.extract_info(url, download=True)
+    if info_dict is not None:
+        video_id = info_dict.get("id")
+        ext = info_dict.get("ext")
+        filename = video_path("t", video_id, ext)
+        # yt-dlp templates cannot hash, so the shard comes from the known ID
+        outtmpl = video_path("t", video_id, "%(ext)s")
+        try:
+            # Downloads from the probe's info instead of extracting again
+            await YtdlpService.download("tiktok", url, info_dict, outtmpl)
 
             if is_valid_video_file(filename):
-                return FileResponse(filename, media_type="video/mp4")
+                return filename
             else:
                 # Remove incomplete file
                 if os.path.exists(filename):
                     os.remove(filename)
                     print(f"Removed incomplete file: {filename}")
-    except Exception as e:
-        last_error = e
-        print(f"yt-dlp method 1 failed: {e}")
+        except Exception as e:
+            last_error = e
+            print(f"yt-dlp method 1 failed: {e}")
 
     # Method 2: Try with embed URL format
     try:
@@ -182,30 +438,24 @@ async def download_tiktok_video_by_id(tiktok_id: str):
         embed_url = f"https://www.tiktok.com/embed/{embed_video_id}"
         print(f"Trying embed URL: {embed_url}")
 
-        ydl_opts_2 = {
-            "outtmpl": os.path.join(VIDEO_DIR_T, "%(id)s.%(ext)s"),
-            "quiet": True,
-            "no_warnings": True,
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts_2) as ydl:
-            info_dict = ydl.extract_info(embed_url, download=False)
-            video_id = info_dict.get("id")
-            ext = info_dict.get("ext")
-            filename = os.path.join(VIDEO_DIR_T, f"{video_id}.{ext}")
+        info_dict = await YtdlpService.extract_info("default", embed_url)
+        video_id = info_dict.get("id")
+        ext = info_dict.get("ext")
+        filename = video_path("t", video_id, ext)
+        outtmpl = video_path("t", video_id, "%(ext)s")
 
-            if is_valid_video_file(filename):
-                return FileResponse(filename, media_type="video/mp4")
+        if is_valid_video_file(filename):
+            return filename
 
-            ydl.extract_info(embed_url, download=True)
+        await YtdlpService.download("default", embed_url, info_dict, outtmpl)
 
-            if is_valid_video_file(filename):
-                return FileResponse(filename, media_type="video/mp4")
-            else:
-                # Remove incomplete file
-                if os.path.exists(filename):
-                    os.remove(filename)
-                    print(f"Removed incomplete file: {filename}")
+        if is_valid_video_file(filename):
+            return filename
+        else:
+            # Remove incomplete file
+            if os.path.exists(filename):
+                os.remove(filename)
+                print(f"Removed incomplete file: {filename}")
     except Exception as e:
         last_error = e
         print(f"yt-dlp method 2 (embed) failed: {e}")
@@ -216,12 +466,12 @@ async def download_tiktok_video_by_id(tiktok_id: str):
             raise HTTPException(
                 status_code=500, detail="No video_id available for tnktok fallback"
             )
-        filename = os.path.join(VIDEO_DIR_T, f"{video_id}.mp4")
+        filename = video_path("t", video_id)
         print(f"Trying vt.tnktok.com fallback with URL: {url}")
-        TiktokService.download_video_with_tnktok(url, filename)
+        await TiktokService.download_video_with_tnktok(url, filename)
 
         if is_valid_video_file(filename, min_size=10240):
-            return FileResponse(filename, media_type="video/mp4")
+            return filename
         else:
             if os.path.exists(filename):
                 os.remove(filename)
@@ -236,12 +486,12 @@ async def download_tiktok_video_by_id(tiktok_id: str):
             raise HTTPException(
                 status_code=500, detail="No video_id available for fallback"
             )
-        filename = os.path.join(VIDEO_DIR_T, f"{video_id}.mp4")
+        filename = video_path("t", video_id)
         print(f"Trying TiktokService fallback with URL: {url}")
-        TiktokService.download_video_with_requests(url, filename)
+        await TiktokService.download_video_with_requests(url, filename)
 
         if is_valid_video_file(filename, min_size=10240):
-            return FileResponse(filename, media_type="video/mp4")
+            return filename
         else:
             if os.path.exists(filename):
                 os.remove(filename)
@@ -256,12 +506,12 @@ async def download_tiktok_video_by_id(tiktok_id: str):
             raise HTTPException(
                 status_code=500, detail="No video_id available for alternative API"
             )
-        filename = os.path.join(VIDEO_DIR_T, f"{video_id}.mp4")
+        filename = video_path("t", video_id)
         print("Trying alternative TikTok download API...")
-        TiktokService.download_video_with_alternative_api(url, filename)
+        await TiktokService.download_video_with_alternative_api(url, filename)
 
         if is_valid_video_file(filename, min_size=10240):
-            return FileResponse(filename, media_type="video/mp4")
+            return filename
         else:
             if os.path.exists(filename):
                 os.remove(filename)
@@ -273,6 +523,44 @@ async def download_tiktok_video_by_id(tiktok_id: str):
     raise HTTPException(
         status_code=500,
         detail=f"All TikTok download methods failed. Last error: {str(last_error)}",
+    ) from last_error
+
+
+async def _get_tiktok_video_file(tiktok_id: str, url: str, bulkhead: str) -> str:
+    # The probe is a full extraction, so it is capped and shed like downloads
+    async with AdmissionService.lane("probe"):
+        filename, info_dict = await _find_cached_tiktok_video(url)
+
+    if filename is None:
+        async with AdmissionService.lane("cold"):
+            filename = await ExecutorService.run(
+                bulkhead, _download_tiktok_video_file, tiktok_id, url, info_dict
+            )
+        CacheService.downloaded(filename)
+
+    # Files are named after the numeric video ID
+    video_id = os.path.splitext(os.path.basename(filename))[0]
+    await AliasService.remember("t", tiktok_id, video_id)
+    return filename
+
+
+async def download_tiktok_video_by_id(tiktok_id: str, bulkhead: str = "t"):
+    filename = await find_cached_video("t", tiktok_id)
+    if filename is not None:
+        return cached_file_response(filename)
+
+    video_id = await AliasService.canonical("t", tiktok_id)
+    if video_id is not None:
+        tiktok_id, url = video_id, get_tiktok_video_url(video_id)
+    else:
+        url = get_tiktok_url(tiktok_id)
+    print(f"Resolved TikTok URL: {url}")
+    if not url:
+        raise HTTPException(status_code=400, detail="Invalid TikTok ID format")
+
+    # Every ID form is normalized to its URL, so e.g. /t/l/<id> and /<id> share
+    return await serve_video(
+        ("t", "download", url), _get_tiktok_video_file, tiktok_id, url, bulkhead
     )
 
 
@@ -283,48 +571,64 @@ def get_x_url(x_id: str) -> str:
     return f"https://x.com/i/status/{x_id}"
 
 
-@app.get("/x/{x_id:path}")
-async def download_x_video(x_id: str, r: Optional[str] = None):
-    if r is not None:
-        video_url = XService.get_video_url(x_id)
-        return RedirectResponse(url=video_url)
-    
-    url = get_x_url(x_id)
-    ydl_opts = {
-        "outtmpl": os.path.join(VIDEO_DIR_X, "%(id)s.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-    }
-
+async def _find_cached_x_video(url: str):
+    """
+    Looks up an X video in the cache.
+    Returns (filename, main_video_info, error). filename is None on a miss;
+    main_video_info is None and error is set when yt-dlp failed.
+    """
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
+        info_dict = await YtdlpService.extract_info("default", url)
+    except Exception as e:
+        return None, None, e
 
-            # If multiple entries (e.g. quoted tweet video), select only the main video
-            if "entries" in info_dict and info_dict["entries"]:
-                # Select the first entry as the main tweet video
-                main_video_info = info_dict["entries"][0]
-            else:
-                main_video_info = info_dict
+    # If multiple entries (e.g. quoted tweet video), select only the main video
+    if "entries" in info_dict and info_dict["entries"]:
+        # Select the first entry as the main tweet video
+        main_video_info = info_dict["entries"][0]
+    else:
+        main_video_info = info_dict
 
-            video_id = main_video_info.get("id")
-            ext = main_video_info.get("ext")
-            filename = os.path.join(VIDEO_DIR_X, f"{video_id}.{ext}")
+    video_id = main_video_info.get("id")
+    ext = main_video_info.get("ext")
+    filename = video_path("x", video_id, ext, create=False)
 
-            if os.path.exists(filename):
-                return FileResponse(filename, media_type="video/mp4")
+    if os.path.exists(filename):
+        return filename, main_video_info, None
+    return None, main_video_info, None
 
-            # Download only the main video
-            ydl.extract_info(main_video_info.get("webpage_url") or url, download=True)
 
-            if not os.path.exists(filename):
-                raise HTTPException(status_code=500, detail="Video download failed")
+async def _download_x_video_file(
+    x_id: str, main_video_info: Optional[dict], error: Optional[Exception]
+) -> str:
+    """X download chain for a cache miss. Returns the path of the video."""
+    url = get_x_url(x_id)
+
+    try:
+        if error is not None:
+            raise error
+
+        video_id = main_video_info.get("id")
+        ext = main_video_info.get("ext")
+        filename = video_path("x", video_id, ext)
+        outtmpl = video_path("x", video_id, "%(ext)s")
+
+        # Download only the main video, from the probe's info
+        await YtdlpService.download(
+            "default",
+            main_video_info.get("webpage_url") or url,
+            main_video_info,
+            outtmpl,
+        )
+
+        if not os.path.exists(filename):
+            raise HTTPException(status_code=500, detail="Video download failed")
     except Exception as e:
         # Fallback to XService (fxtwitter) if yt-dlp fails
         try:
-            filename = os.path.join(VIDEO_DIR_X, f"{x_id}.mp4")
+            filename = video_path("x", x_id)
             print(f"Trying XService fallback with x_id: {x_id}")
-            XService.download_video_with_fxtwitter(x_id, filename)
+            await XService.download_video_with_fxtwitter(x_id, filename)
 
             if not os.path.exists(filename):
                 raise HTTPException(
@@ -336,7 +640,37 @@ async def download_x_video(x_id: str, r: Optional[str] = None):
                 detail=f"Error downloading video: {str(e)}; Fallback error: {str(fallback_e)}",
             )
 
-    return FileResponse(filename, media_type="video/mp4")
+    return filename
+
+
+async def _get_x_video_file(x_id: str) -> str:
+    async with AdmissionService.lane("probe"):
+        filename, main_video_info, error = await _find_cached_x_video(get_x_url(x_id))
+
+    if filename is None:
+        async with AdmissionService.lane("cold"):
+            filename = await ExecutorService.run(
+                "x", _download_x_video_file, x_id, main_video_info, error
+            )
+        CacheService.downloaded(filename)
+
+    await AliasService.remember(
+        "x", x_id, os.path.splitext(os.path.basename(filename))[0]
+    )
+    return filename
+
+
+@app.get("/x/{x_id:path}")
+async def download_x_video(x_id: str, r: Optional[str] = None):
+    if r is not None:
+        video_url = await resolve_video_url("x", x_id, XService.get_video_url, x_id)
+        return RedirectResponse(url=video_url)
+
+    filename = await find_cached_video("x", x_id)
+    if filename is not None:
+        return cached_file_response(filename)
+
+    return await serve_video(("x", "download", x_id), _get_x_video_file, x_id)
 
 
 def get_facebook_url(facebook_id: str) -> str:
@@ -345,17 +679,17 @@ def get_facebook_url(facebook_id: str) -> str:
     return f"https://www.facebook.com/reel/{facebook_id}"
 
 
-async def download_facebook_video_by_id(facebook_id: str):
-    # Check if facebook_id matches the pattern like 1AZfMP4wBz (length and character types)
-    original_facebook_id = facebook_id
-    is_share_type = bool(re.fullmatch(r"[A-Za-z0-9]{10}", facebook_id))
-
+async def _resolve_facebook_url(facebook_id: str, is_share_type: bool):
+    """
+    Resolves short share IDs to the underlying video ID.
+    Returns (facebook_id, url).
+    """
     if is_share_type:
         print(f"Detected short Facebook ID: {facebook_id}")
         # Make a request to get the 302 redirect location header
         share_url = f"https://www.facebook.com/share/v/{facebook_id}/"
         try:
-            response = requests.head(share_url, allow_redirects=False)
+            response = await HttpClientService.head(share_url, follow_redirects=False)
             print(f"Response: {response.headers}")
             if response.status_code == 302 or response.status_code == 307:
                 location = response.headers.get("location")
@@ -398,37 +732,58 @@ async def download_facebook_video_by_id(facebook_id: str):
     else:
         url = get_facebook_url(facebook_id)
 
-    ydl_opts = {
-        "outtmpl": os.path.join(VIDEO_DIR_F, "%(id)s.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-    }
+    return facebook_id, url
 
+
+async def _find_cached_facebook_video(url: str):
+    """
+    Looks up a Facebook video in the cache.
+    Returns (filename, info_dict, error). filename is None on a miss;
+    info_dict is None and error is set when yt-dlp failed.
+    """
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            video_id = info_dict.get("id")
-            ext = info_dict.get("ext")
-            filename = os.path.join(VIDEO_DIR_F, f"{video_id}.{ext}")
+        info_dict = await YtdlpService.extract_info("default", url)
+    except Exception as e:
+        return None, None, e
 
-            if os.path.exists(filename):
-                return FileResponse(filename, media_type="video/mp4")
-            # print(f"Downloading Facebook video: {url}")
+    filename = video_path("f", info_dict.get("id"), info_dict.get("ext"), create=False)
+    if os.path.exists(filename):
+        return filename, info_dict, None
+    return None, info_dict, None
+
+
+async def _download_facebook_video_file(
+    facebook_id: str,
+    url: str,
+    original_facebook_id: str,
+    is_share_type: bool,
+    info_dict: Optional[dict],
+    error: Optional[Exception],
+) -> str:
+    """Facebook download chain for a cache miss. Returns the path of the video."""
+    try:
+        if error is not None:
+            raise error
+        video_id = info_dict.get("id")
+        ext = info_dict.get("ext")
+        filename = video_path("f", video_id, ext)
+        outtmpl = video_path("f", video_id, "%(ext)s")
+        # print(f"Downloading Facebook video: {url}")
 
-            ydl.extract_info(url, download=True)
+        await YtdlpService.download("default", url, info_dict, outtmpl)
 
-            if not os.path.exists(filename):
-                raise HTTPException(status_code=500, detail="Video download failed")
+        if not os.path.exists(filename):
+            raise HTTPException(status_code=500, detail="Video download failed")
     except Exception as e:
         # Fallback a FacebookService si falla yt_dlp
         try:
-            filename = os.path.join(VIDEO_DIR_F, f"{facebook_id}.mp4")
+            filename = video_path("f", facebook_id)
             if is_share_type:
-                FacebookService.download_video_from_fixacebook(
+                await FacebookService.download_video_from_fixacebook(
                     original_facebook_id, filename
                 )
             else:
-                FacebookService.download_video_with_requests(url, filename)
+                await FacebookService.download_video_with_requests(url, filename)
         except Exception as fallback_e:
             raise HTTPException(
                 status_code=500,
@@ -440,45 +795,104 @@ async def download_facebook_video_by_id(facebook_id: str):
                 status_code=500, detail="Video download failed in fallback"
             )
 
-    return FileResponse(filename, media_type="video/mp4")
+    return filename
+
+
+async def _get_facebook_video_file(facebook_id: str) -> str:
+    # Check if facebook_id matches the pattern like 1AZfMP4wBz (length and character types)
+    original_facebook_id = facebook_id
+    is_share_type = bool(re.fullmatch(r"[A-Za-z0-9]{10}", facebook_id))
+
+    async with AdmissionService.lane("probe"):
+        resolved_id = None
+        if is_share_type:
+            resolved_id = await AliasService.resolve("f", facebook_id)
+        if resolved_id is not None:
+            facebook_id, url = resolved_id, get_facebook_url(resolved_id)
+        else:
+            facebook_id, url = await _resolve_facebook_url(facebook_id, is_share_type)
+            await AliasService.remember("f", original_facebook_id, facebook_id)
+        filename, info_dict, error = await _find_cached_facebook_video(url)
+
+    if filename is None:
+        async with AdmissionService.lane("cold"):
+            filename = await ExecutorService.run(
+                "f",
+                _download_facebook_video_file,
+                facebook_id,
+                url,
+                original_facebook_id,
+                is_share_type,
+                info_dict,
+                error,
+            )
+        CacheService.downloaded(filename)
+
+    await AliasService.remember(
+        "f", facebook_id, os.path.splitext(os.path.basename(filename))[0]
+    )
+    return filename
+
+
+async def download_facebook_video_by_id(facebook_id: str):
+    filename = await find_cached_video("f", facebook_id)
+    if filename is not None:
+        return cached_file_response(filename)
+
+    return await serve_video(
+        ("f", "download", facebook_id), _get_facebook_video_file, facebook_id
+    )
 
 
 def get_instagram_url(instagram_id: str) -> str:
     return f"https://www.instagram.com/p/{instagram_id}/"
 
 
-async def download_instagram_video_by_id(instagram_id: str):
+async def _find_cached_instagram_video(instagram_id: str):
+    """
+    Looks up an Instagram video in the cache.
+    Returns (filename, ext, error). filename is None on a miss; ext is None
+    and error is set when yt-dlp failed.
+    """
     url = get_instagram_url(instagram_id)
+    try:
+        info_dict = await YtdlpService.extract_info("default", url)
+    except Exception as e:
+        return None, None, e
 
-    ydl_opts = {
-        "outtmpl": os.path.join(VIDEO_DIR_I, f"{instagram_id}.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-    }
+    ext = info_dict.get("ext")
+    filename = video_path("i", instagram_id, ext, create=False)
+    if os.path.exists(filename):
+        return filename, ext, None
+    return None, ext, None
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            ext = info_dict.get("ext")
-            filename = os.path.join(VIDEO_DIR_I, f"{instagram_id}.{ext}")
 
-            if os.path.exists(filename):
-                return FileResponse(filename, media_type="video/mp4")
+async def _download_instagram_video_file(
+    instagram_id: str, ext: Optional[str], error: Optional[Exception]
+) -> str:
+    """Instagram download chain for a cache miss. Returns the path of the video."""
+    url = get_instagram_url(instagram_id)
+    outtmpl = video_path("i", instagram_id, "%(ext)s")
 
-            ydl.extract_info(url, download=True)
+    try:
+        if error is not None:
+            raise error
+        filename = video_path("i", instagram_id, ext)
 
-            if not os.path.exists(filename):
-                raise HTTPException(status_code=500, detail="Video download failed")
+        await YtdlpService.extract_info("default", url, download=True, outtmpl=outtmpl)
+
+        if not os.path.exists(filename):
+            raise HTTPException(status_code=500, detail="Video download failed")
     except Exception as e:
         # Fallback 1: vxinstagram.com
         try:
-            filename = os.path.join(VIDEO_DIR_I, f"{instagram_id}.mp4")
-            InstagramService.download_video_with_vxinstagram(url, filename)
+            filename = video_path("i", instagram_id)
+            await InstagramService.download_video_with_vxinstagram(url, filename)
         except Exception as vx_e:
             # Fallback to InstagramService download with requests
             try:
-                filename = os.path.join(VIDEO_DIR_I, f"{instagram_id}.mp4")
-                InstagramService.download_video_with_requests(url, filename)
+                filename = video_path("i", instagram_id)
+                await InstagramService.download_video_with_requests(url, filename)
             except Exception as fallback_e:
                 raise HTTPException(
                     status_code=500,
@@ -490,14 +904,39 @@ async def download_instagram_video_by_id(instagram_id: str):
                 status_code=500, detail="Video download failed in fallback"
             )
 
-    return FileResponse(filename, media_type="video/mp4")
+    return filename
+
+
+async def _get_instagram_video_file(instagram_id: str) -> str:
+    async with AdmissionService.lane("probe"):
+        filename, ext, error = await _find_cached_instagram_video(instagram_id)
+
+    if filename is None:
+        async with AdmissionService.lane("cold"):
+            filename = await ExecutorService.run(
+                "i", _download_instagram_video_file, instagram_id, ext, error
+            )
+        CacheService.downloaded(filename)
+    return filename
+
+
+async def download_instagram_video_by_id(instagram_id: str):
+    filename = await find_cached_video("i", instagram_id)
+    if filename is not None:
+        return cached_file_response(filename)
+
+    return await serve_video(
+        ("i", "download", instagram_id), _get_instagram_video_file, instagram_id
+    )
 
 
 @app.get("/i/{instagram_id}")
 async def download_instagram_video(instagram_id: str, r: Optional[str] = None):
     if r is not None:
         url = get_instagram_url(instagram_id)
-        video_url = InstagramService.get_video_url(url)
+        video_url = await resolve_video_url(
+            "i", instagram_id, InstagramService.get_video_url, url
+        )
         return RedirectResponse(url=video_url)
     return await download_instagram_video_by_id(instagram_id)
 
@@ -507,21 +946,18 @@ def get_threads_url(thread_code: str) -> str:
     return f"https://www.threads.net/i/post/{thread_code}"
 
 
-@app.get("/h/{thread_code}")
-async def download_threads_video(thread_code: str, r: Optional[str] = None):
-    if r is not None:
-        video_url = ThreadsService.get_video_url(thread_code)
-        return RedirectResponse(url=video_url)
-    
-    url = get_threads_url(thread_code)
-    filename = os.path.join(VIDEO_DIR_H, f"{thread_code}.mp4")
-
-    # Check if file already exists
+async def _download_threads_video_file(thread_code: str, filename: str) -> str:
+    # Another worker may have finished it while we waited for the lock
     if os.path.exists(filename):
-        return FileResponse(filename, media_type="video/mp4")
+        return filename
 
     try:
-        ThreadsService.download_video(thread_code, filename)
+        async with AdmissionService.lane("cold"):
+            await ExecutorService.run(
+                "h", ThreadsService.download_video, thread_code, filename
+            )
+    except HTTPException:
+        raise
     except Exception as e:
         if os.path.exists(filename):
             os.remove(filename)
@@ -532,14 +968,39 @@ async def download_threads_video(thread_code: str, r: Optional[str] = None):
     if not os.path.exists(filename):
         raise HTTPException(status_code=500, detail="Video download failed")
 
-    return FileResponse(filename, media_type="video/mp4")
+    CacheService.downloaded(filename, "threads")
+    return filename
+
+
+@app.get("/h/{thread_code}")
+async def download_threads_video(thread_code: str, r: Optional[str] = None):
+    if r is not None:
+        video_url = await resolve_video_url(
+            "h", thread_code, ThreadsService.get_video_url, thread_code
+        )
+        return RedirectResponse(url=video_url)
+
+    cached = await find_cached_video("h", thread_code)
+    if cached is not None:
+        return cached_file_response(cached)
+
+    filename = video_path("h", thread_code)
+
+    return await serve_video(
+        ("h", "download", thread_code),
+        _download_threads_video_file,
+        thread_code,
+        filename,
+    )
 
 
 @app.get("/t/l/{video_id}")
 async def download_tiktok_video_long(video_id: str, r: Optional[str] = None):
     if r is not None:
-        url = get_tiktok_url(f"l/{video_id}")
-        video_url = TiktokService.get_video_url(url)
+        url = await resolve_tiktok_url(f"l/{video_id}")
+        video_url = await resolve_video_url(
+            "t", f"l/{video_id}", TiktokService.get_video_url, url
+        )
         return RedirectResponse(url=video_url)
     return await download_tiktok_video_by_id(f"l/{video_id}")
 
@@ -547,8 +1008,10 @@ async def download_tiktok_video_long(video_id: str, r: Optional[str] = None):
 @app.get("/t/{tiktok_id:path}")
 async def download_tiktok_video_t(tiktok_id: str, r: Optional[str] = None):
     if r is not None:
-        url = get_tiktok_url(tiktok_id)
-        video_url = TiktokService.get_video_url(url)
+        url = await resolve_tiktok_url(tiktok_id)
+        video_url = await resolve_video_url(
+            "t", tiktok_id, TiktokService.get_video_url, url
+        )
         return RedirectResponse(url=video_url)
     return await download_tiktok_video_by_id(tiktok_id)
 
@@ -559,29 +1022,28 @@ async def download_facebook_video(facebook_id: str, r: Optional[str] = None):
         original_facebook_id = facebook_id
         is_share_type = bool(re.fullmatch(r"[A-Za-z0-9]{10}", facebook_id))
         url = get_facebook_url(facebook_id)
-        video_url = FacebookService.get_video_url(url, is_share_type, original_facebook_id if is_share_type else None)
+        video_url = await resolve_video_url(
+            "f",
+            facebook_id,
+            FacebookService.get_video_url,
+            url,
+            is_share_type,
+            original_facebook_id if is_share_type else None,
+        )
         return RedirectResponse(url=video_url)
     return await download_facebook_video_by_id(facebook_id)
 
 
-@app.get("/y/{video_id}")
-async def download_youtube_video(video_id: str, r: Optional[str] = None):
-    return {"detail": "youtube no disponible"}
-    if r is not None:
-        stream_url = await YoutubeService.get_stream_url(video_id)
-        return RedirectResponse(url=stream_url)
-
-    duration = await YoutubeService.get_duration(video_id)
-    if duration > YoutubeService.DURATION_THRESHOLD_SECONDS:
-        stream_url = await YoutubeService.get_stream_url(video_id)
-        return RedirectResponse(url=stream_url)
-
-    filename = os.path.join(VIDEO_DIR_Y, f"{video_id}.mp4")
+async def _download_youtube_video_file(video_id: str, filename: str) -> str:
+    # Another worker may have finished it while we waited for the lock
     if os.path.exists(filename):
-        return FileResponse(filename, media_type="video/mp4")
+        return filename
 
     try:
-        await YoutubeService.download_video(video_id, filename)
+        async with AdmissionService.lane("cold"):
+            await YoutubeService.download_video(video_id, filename)
+    except HTTPException:
+        raise
     except Exception as e:
         if os.path.exists(filename):
             os.remove(filename)
@@ -592,13 +1054,98 @@ async def download_youtube_video(video_id: str, r: Optional[str] = None):
     if not os.path.exists(filename):
         raise HTTPException(status_code=500, detail="Video download failed")
 
-    return FileResponse(filename, media_type="video/mp4")
+    CacheService.downloaded(filename)
+    return filename
+
+
+@app.get("/y/{video_id}")
+async def download_youtube_video(video_id: str, r: Optional[str] = None):
+    return {"detail": "youtube no disponible"}
+    if r is not None:
+        stream_url = await resolve_video_url(
+            "y", video_id, YoutubeService.get_stream_url, video_id
+        )
+        return RedirectResponse(url=stream_url)
+
+    try:
+        duration = await YoutubeService.get_duration(video_id)
+    except YoutubeVideoNotFound:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if duration > YoutubeService.DURATION_THRESHOLD_SECONDS:
+        stream_url = await resolve_video_url(
+            "y", video_id, YoutubeService.get_stream_url, video_id
+        )
+        return RedirectResponse(url=stream_url)
+
+    cached = await find_cached_video("y", video_id)
+    if cached is not None:
+        return cached_file_response(cached)
+
+    filename = video_path("y", video_id)
+
+    return await serve_video(
+        ("y", "download", video_id), _download_youtube_video_file, video_id, filename
+    )
 
 
 @app.get("/{tiktok_id:path}")
 async def download_tiktok_video(tiktok_id: str, r: Optional[str] = None):
     if r is not None:
-        url = get_tiktok_url(tiktok_id)
-        video_url = TiktokService.get_video_url(url)
+        url = await resolve_tiktok_url(tiktok_id)
+        video_url = await resolve_video_url(
+            "t", tiktok_id, TiktokService.get_video_url, url
+        )
         return RedirectResponse(url=video_url)
-    return await download_tiktok_video_by_id(tiktok_id)
+    return await download_tiktok_video_by_id(tiktok_id, bulkhead="root")
+
+
+def split_limits(workers: int) -> None:
+    """
+    Divides the host-wide defaults of the per-process limits between the
+    uvicorn workers, so running more workers does not multiply them:
+    admission slots and lanes, bulkheads, the hot cache budget and the
+    rate limit refill rates. Limits set explicitly in the environment are
+    per worker and left alone.
+    """
+
+    def share(name: str, value: float, minimum: int = 1) -> None:
+        os.environ.setdefault(name, str(max(minimum, math.ceil(value / workers))))
+
+    share("ADMISSION_MAX_CONCURRENT", AdmissionService.MAX_CONCURRENT)
+    for lane, (reserved, limit, max_queue) in AdmissionService.LANES.items():
+        prefix = f"ADMISSION_{lane.upper()}"
+        # Rounded down, so the reserved slots still fit in MAX_CONCURRENT
+        os.environ.setdefault(f"{prefix}_RESERVED", str(reserved // workers))
+        share(f"{prefix}_LIMIT", limit)
+        if max_queue is not None:
+            share(f"{prefix}_QUEUE", max_queue)
+    for name, (max_workers, max_queue) in ExecutorService.BULKHEADS.items():
+        share(f"BULKHEAD_{name.upper()}_WORKERS", max_workers)
+        share(f"BULKHEAD_{name.upper()}_QUEUE", max_queue)
+    share("HOT_CACHE_MAX_BYTES", HotCacheService.MAX_BYTES, minimum=0)
+    for prefix, (rate, _) in RateLimitService.LIMITS.items():
+        # Behind a proxy a client's requests land on every worker's buckets;
+        # bursts stay whole for clients whose connection sticks to one
+        env = f"RATE_LIMIT_{prefix.upper()}_RATE"
+        os.environ.setdefault(env, str(rate / workers))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    # Split the yt-dlp process pool across workers instead of giving each
+    # worker one process per core, but leave each one a process for
+    # downloads besides those reserved for metadata lookups
+    ytdlp_workers = max(
+        YtdlpService.RESERVED_WORKERS + 1, (os.cpu_count() or 1) // workers
+    )
+    os.environ.setdefault("YTDLP_WORKERS", str(ytdlp_workers))
+    split_limits(workers)
+    # Workers coordinate downloads of the same video through FileLockService
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+    )
@@ -0,0 +1,273 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from typing import Optional, Dict, Any
+from services.RateLimitService import RateLimitService
+
+
+class FairQueue:
+    """
+    Per-client FIFO queues served round-robin, so a client with many queued
+    requests only gets one turn per round.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, deque] = {}
+        self._order: deque = deque()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clients(self) -> int:
+        return len(self._queues)
+
+    def append(self, client: str, item) -> None:
+        queue = self._queues.get(client)
+        if queue is None:
+            queue = self._queues[client] = deque()
+            self._order.append(client)
+        queue.append(item)
+        self._size += 1
+
+    def popleft(self):
+        client = self._order.popleft()
+        queue = self._queues[client]
+        item = queue.popleft()
+        self._size -= 1
+        if queue:
+            self._order.append(client)
+        else:
+            del self._queues[client]
+        return item
+
+    def remove(self, client: str, item) -> None:
+        """Raises ValueError if item is not queued."""
+        queue = self._queues.get(client)
+        if queue is None:
+            raise ValueError(item)
+        queue.remove(item)
+        self._size -= 1
+        if not queue:
+            del self._queues[client]
+            self._order.remove(client)
+
+
+class Lane:
+    """
+    One priority class of requests with its own reserved slots, concurrency
+    limit, per-client fair queue and metrics. Lanes with max_queue=None are
+    never shed and never time out.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        reserved: int,
+        limit: int,
+        max_queue: Optional[int],
+        initial_service_time: float,
+    ):
+        self.name = name
+        self.reserved = reserved
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters = FairQueue()
+        self.service_time = initial_service_time
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def predicted_wait(self) -> float:
+        """Seconds a new arrival is expected to queue before it starts."""
+        if self.active < self.limit and not self.waiters:
+            return 0.0
+        return (len(self.waiters) + 1) * self.service_time / self.limit
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "reserved": self.reserved,
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": len(self.waiters),
+            "waiting_clients": self.waiters.clients(),
+            "avg_service_seconds": round(self.service_time, 3),
+            "predicted_wait_seconds": round(self.predicted_wait(), 3),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdmissionService:
+    """
+    Admission control with priority lanes. Cache lookups, redirect
+    resolutions, cache probes (the yt-dlp extraction that tells a chain
+    which file it needs) and cold downloads each get reserved slots; the
+    rest of the MAX_CONCURRENT slots are shared and handed out in lane
+    priority order, so cheap requests never queue behind a download storm. Within a lane,
+    queued requests are served round-robin per client.
+
+    Sheddable lanes reject new arrivals with a fast 503 and Retry-After when
+    their queue is full or the predicted queue wait exceeds QUEUE_SLO, and
+    give up after MAX_WAIT seconds in the queue.
+
+    Lane sizes can be overridden with ADMISSION_<LANE>_RESERVED,
+    ADMISSION_<LANE>_LIMIT and ADMISSION_<LANE>_QUEUE.
+    """
+
+    # Slots shared by all lanes, reserved ones included
+    MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+    # Seconds a request may wait in the queue before giving up
+    MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+    # Predicted queue wait (seconds) above which new arrivals are shed
+    QUEUE_SLO = float(os.getenv("ADMISSION_QUEUE_SLO", "20"))
+    # Assumed cold download duration until real samples arrive
+    INITIAL_SERVICE_TIME = float(os.getenv("ADMISSION_INITIAL_SERVICE_TIME", "10"))
+    # Weight of the newest sample in the service time average
+    EWMA_ALPHA = 0.2
+
+    # name: (reserved, limit, max_queue), highest priority first.
+    # A max_queue of None means the lane is never shed, so it is only for
+    # zero-network work (index and disk lookups); anything that extracts
+    # or resolves over the network must use a sheddable lane.
+    LANES = {
+        "hit": (16, 64, None),
+        "redirect": (8, 32, 128),
+        "probe": (4, 16, 64),
+        "cold": (0, 32, 256),
+    }
+
+    _lanes: Dict[str, Lane] = {}
+
+    @classmethod
+    def get(cls, name: str) -> Lane:
+        lane = cls._lanes.get(name)
+        if lane is None:
+            reserved, limit, max_queue = cls.LANES[name]
+            prefix = f"ADMISSION_{name.upper()}"
+            max_queue = os.getenv(f"{prefix}_QUEUE", max_queue)
+            lane = Lane(
+                name,
+                reserved=int(os.getenv(f"{prefix}_RESERVED", reserved)),
+                limit=int(os.getenv(f"{prefix}_LIMIT", limit)),
+                max_queue=int(max_queue) if max_queue is not None else None,
+                initial_service_time=(
+                    cls.INITIAL_SERVICE_TIME if name == "cold" else 1.0
+                ),
+            )
+            cls._lanes[name] = lane
+        return lane
+
+    @classmethod
+    @asynccontextmanager
+    async def lane(cls, name: str):
+        """Holds a slot in the named lane for the duration of the block."""
+        lane = cls.get(name)
+        await cls._acquire(lane)
+        started_at = time.monotonic()
+        try:
+            yield lane
+        finally:
+            cls._release(lane, time.monotonic() - started_at)
+
+    @classmethod
+    def _shared_free(cls) -> int:
+        lanes = [cls.get(name) for name in cls.LANES]
+        shared = cls.MAX_CONCURRENT - sum(lane.reserved for lane in lanes)
+        borrowed = sum(max(0, lane.active - lane.reserved) for lane in lanes)
+        return shared - borrowed
+
+    @classmethod
+    def _can_start(cls, lane: Lane) -> bool:
+        if lane.active >= lane.limit:
+            return False
+        if lane.active < lane.reserved:
+            return True
+        if cls._shared_free() <= 0:
+            return False
+        # Shared slots go to higher-priority lanes first
+        for name in cls.LANES:
+            other = cls.get(name)
+            if other is lane:
+                return True
+            if other.waiters and other.active < other.limit:
+                return False
+        return True
+
+    @staticmethod
+    def _reject(retry_after: float, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    @classmethod
+    async def _acquire(cls, lane: Lane) -> None:
+        if not lane.waiters and cls._can_start(lane):
+            lane.active += 1
+            lane.admitted += 1
+            return
+
+        if lane.max_queue is not None:
+            predicted = lane.predicted_wait()
+            if predicted > cls.QUEUE_SLO or len(lane.waiters) >= lane.max_queue:
+                lane.shed += 1
+                raise cls._reject(predicted, "Server overloaded, try again later")
+
+        client = RateLimitService.current_client.get()
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiters.append(client, waiter)
+        timeout = cls.MAX_WAIT if lane.max_queue is not None else None
+        try:
+            # _dispatch counts the slot as ours before resolving the future
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was granted just as we gave up; pass it on
+                cls._release(lane, None)
+            else:
+                waiter.cancel()
+                try:
+                    lane.waiters.remove(client, waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                lane.timed_out += 1
+                raise cls._reject(lane.predicted_wait(), "Timed out waiting for a slot")
+            raise
+        lane.admitted += 1
+
+    @classmethod
+    def _release(cls, lane: Lane, duration: Optional[float]) -> None:
+        if duration is not None:
+            lane.service_time += cls.EWMA_ALPHA * (duration - lane.service_time)
+        lane.active -= 1
+        cls._dispatch()
+
+    @classmethod
+    def _dispatch(cls) -> None:
+        """Grants free slots to queued requests in lane priority order."""
+        for name in cls.LANES:
+            lane = cls.get(name)
+            while lane.waiters and cls._can_start(lane):
+                waiter = lane.waiters.popleft()
+                if waiter.done():
+                    continue
+                lane.active += 1
+                waiter.set_result(None)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "max_concurrent": cls.MAX_CONCURRENT,
+            "shared_free": cls._shared_free(),
+            "lanes": {name: cls.get(name).stats() for name in cls.LANES},
+        }
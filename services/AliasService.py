@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+class AliasService:
+    """
+    Persistent map from every form a video was requested as (short codes,
+    share IDs, l/<id>, user/<id>...) to its canonical (platform, id), so a
+    form that was resolved once never needs a network call to resolve
+    again. Lookups are served from an in-memory mirror of the
+    ALIAS_MIRROR_SIZE most recently used aliases; misses fall back to
+    SQLite, which other worker processes write to as well.
+    """
+
+    DB_PATH = os.getenv("INDEX_DB_PATH", "./videos/index.sqlite3")
+
+    MIRROR_SIZE = int(os.getenv("ALIAS_MIRROR_SIZE", "50000"))
+    # platform: forms that contain the canonical ID, which need no alias.
+    # TikTok: @user/video/<id>, user/<id>, l/<id> and bare long IDs;
+    # shorter bare numbers are short codes only TikTok can resolve.
+    ID_FORMS = {"t": re.compile(r"@[^/]+/video/(\d+)|[^/]+/(\d+)|(\d{19,})")}
+
+    _aliases: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def _mirror_put(cls, platform: str, alias: str, canonical_id: str) -> None:
+        key = (platform, alias)
+        cls._aliases[key] = canonical_id
+        cls._aliases.move_to_end(key)
+        while len(cls._aliases) > cls.MIRROR_SIZE:
+            cls._aliases.popitem(last=False)
+
+    @classmethod
+    def _get_conn(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            os.makedirs(os.path.dirname(cls.DB_PATH) or ".", exist_ok=True)
+            conn = sqlite3.connect(cls.DB_PATH, timeout=10, check_same_thread=False)
+            # WAL lets readers in other workers proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                " platform TEXT NOT NULL,"
+                " alias TEXT NOT NULL,"
+                " canonical_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (platform, alias))"
+            )
+            conn.commit()
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def _select(cls, platform: str, alias: str) -> Optional[str]:
+        with cls._lock:
+            row = (
+                cls._get_conn()
+                .execute(
+                    "SELECT canonical_id FROM aliases WHERE platform = ? AND alias = ?",
+                    (platform, alias),
+                )
+                .fetchone()
+            )
+        return row[0] if row else None
+
+    @classmethod
+    def _insert(cls, platform: str, alias: str, canonical_id: str) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?)",
+                (platform, alias, canonical_id, time.time()),
+            )
+            conn.commit()
+
+    @classmethod
+    def parse(cls, platform: str, request_id: str) -> Optional[str]:
+        """
+        The canonical ID of forms that contain it, read from the form
+        itself without any lookup. None for other forms.
+        """
+        pattern = cls.ID_FORMS.get(platform)
+        match = pattern.fullmatch(request_id) if pattern is not None else None
+        if match is None:
+            return None
+        return next(group for group in match.groups() if group)
+
+    @classmethod
+    async def canonical(cls, platform: str, request_id: str) -> Optional[str]:
+        """
+        The canonical ID of request_id: parsed from the form when it
+        contains one, else resolved through the alias table. None if the
+        form was never resolved.
+        """
+        return cls.parse(platform, request_id) or await cls.resolve(
+            platform, request_id
+        )
+
+    @classmethod
+    async def resolve(cls, platform: str, alias: str) -> Optional[str]:
+        """Returns the canonical ID for alias, or None if it was never resolved."""
+        canonical_id = cls._aliases.get((platform, alias))
+        if canonical_id is None:
+            canonical_id = await asyncio.to_thread(cls._select, platform, alias)
+            if canonical_id is None:
+                cls.misses += 1
+                return None
+        cls._mirror_put(platform, alias, canonical_id)
+        cls.hits += 1
+        return canonical_id
+
+    @classmethod
+    async def remember(cls, platform: str, alias: str, canonical_id: str) -> None:
+        """Records that alias refers to canonical_id."""
+        if not canonical_id or canonical_id == alias:
+            return
+        if cls._aliases.get((platform, alias)) == canonical_id:
+            return
+        cls._mirror_put(platform, alias, canonical_id)
+        try:
+            await asyncio.to_thread(cls._insert, platform, alias, canonical_id)
+        except sqlite3.Error as e:
+            # The in-memory entry still saves this process the round trip
+            print(f"Error saving alias {platform}/{alias}: {e}")
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._conn is not None:
+                cls._conn.close()
+                cls._conn = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {"cached": len(cls._aliases), "hits": cls.hits, "misses": cls.misses}
@@ -0,0 +1,136 @@
+import os
+import hashlib
+from typing import Optional, Dict, Any
+from services.ExecutorService import ExecutorService
+
+
+class BlobStoreService:
+    """
+    Content-addressed storage for cached videos. Each unique video is kept
+    once as BLOB_DIR/<ab>/<sha256>; the per-ID files under the platform
+    directories are hardlinks to it. Disk usage and page cache therefore
+    scale with unique videos, however many names or platforms point at
+    them. A blob whose last per-ID link was deleted is garbage collected.
+    """
+
+    BLOB_DIR = os.getenv("BLOB_DIR", "./videos/blobs")
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    stored = 0
+    deduplicated = 0
+    bytes_saved = 0
+    collected = 0
+
+    @classmethod
+    def blob_path(cls, digest: str) -> str:
+        return os.path.join(cls.BLOB_DIR, digest[:2], digest)
+
+    @staticmethod
+    def is_stored(path: str) -> bool:
+        """True if path is already a link to a blob."""
+        try:
+            return os.stat(path).st_nlink > 1
+        except FileNotFoundError:
+            return False
+
+    @classmethod
+    def hash_file(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(cls.HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def link(cls, path: str, digest: Optional[str] = None) -> str:
+        """
+        Makes path a hardlink to the blob for its content, creating the
+        blob from path if it is new. Returns the content digest.
+        Raises OSError if linking fails.
+        """
+        if digest is None:
+            digest = cls.hash_file(path)
+        blob = cls.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+            cls.stored += 1
+            return digest
+        except FileExistsError:
+            pass
+
+        if os.path.samefile(path, blob):
+            return digest
+        size = os.path.getsize(path)
+        # Swap path for a link to the existing blob; the rename is atomic
+        tmp_path = f"{path}.{os.getpid()}.link"
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, path)
+        # Hardlinks share the blob's mtime; count this as a fresh download
+        os.utime(path)
+        cls.deduplicated += 1
+        cls.bytes_saved += size
+        return digest
+
+    @classmethod
+    def _store(cls, path: str, digest: Optional[str]) -> Optional[str]:
+        if cls.is_stored(path):
+            return None
+        try:
+            return cls.link(path, digest)
+        except OSError as e:
+            # Filesystems without hardlinks keep working with plain files
+            print(f"Error storing {path} as blob: {e}")
+            return None
+
+    @classmethod
+    async def ingest(cls, path: str, digest: Optional[str] = None) -> Optional[str]:
+        """
+        Moves a downloaded file into the store off the event loop.
+        Returns its digest, or None if it was stored already or could not
+        be. Never raises: a file that could not be stored is still served
+        as is.
+        """
+        if not os.path.exists(path) or cls.is_stored(path):
+            return None
+        try:
+            return await ExecutorService.run("store", cls._store, path, digest)
+        except Exception as e:
+            print(f"Error storing {path} as blob: {e}")
+            return None
+
+    @classmethod
+    def release(cls, digest: str) -> None:
+        """Deletes the blob for digest if no cached file links to it any more."""
+        blob = cls.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink == 1:
+                os.remove(blob)
+                cls.collected += 1
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def collect_garbage(cls) -> None:
+        """Deletes blobs that no cached file links to any more."""
+        if not os.path.isdir(cls.BLOB_DIR):
+            return
+        for shard in os.listdir(cls.BLOB_DIR):
+            shard_dir = os.path.join(cls.BLOB_DIR, shard)
+            for name in os.listdir(shard_dir):
+                blob = os.path.join(shard_dir, name)
+                try:
+                    if os.stat(blob).st_nlink == 1:
+                        os.remove(blob)
+                        cls.collected += 1
+                except FileNotFoundError:
+                    pass
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "stored": cls.stored,
+            "deduplicated": cls.deduplicated,
+            "bytes_saved": cls.bytes_saved,
+            "collected": cls.collected,
+        }
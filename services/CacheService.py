@@ -0,0 +1,479 @@
+import os
+import time
+import hashlib
+import asyncio
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple
+from services.ExecutorService import ExecutorService
+from services.FileLockService import FileLockService
+from services.BlobStoreService import BlobStoreService
+from services.FrequencyService import FrequencyService
+from services.HotCacheService import HotCacheService
+from services.IndexService import IndexService, VideoRecord
+
+
+class Download:
+    """What a download chain fetched from upstream, and how."""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.source: Optional[str] = None
+        self.digest: Optional[str] = None
+
+
+class CacheService:
+    """
+    Keeps every platform directory within a byte budget. Videos are stored
+    sharded by a hash of their ID, as <platform dir>/ab/cd/<id>.<ext>, and
+    eviction works off IndexService rather than directory listings: when
+    a platform's indexed bytes pass its high watermark, its least recently
+    accessed videos are evicted until it is back under the low watermark,
+    and videos idle for longer than MAX_IDLE are evicted anyway.
+
+    A walker visits WALK_SHARDS first-level shards per pass, indexing any
+    file the index does not know about and removing stale leftovers of
+    interrupted downloads; on the way it moves files from the old flat
+    layout into their shards. Passes run in the "cache" bulkhead, one
+    worker process per platform at a time. Besides the periodic pass, a
+    platform is checked as soon as the files served from it may have
+    pushed it past its high watermark.
+
+    Once a directory is full, a new download only stays if FrequencyService
+    ranks it above the directory's next eviction victim; otherwise it is
+    served to the requests waiting on it and then dropped.
+
+    The total budget is CACHE_MAX_BYTES, split between platforms by SHARES
+    unless overridden with CACHE_<PLATFORM>_MAX_BYTES, e.g.
+    CACHE_T_MAX_BYTES=8000000000.
+    """
+
+    MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(10 * 1024**3)))
+    SHARES = {"t": 0.4, "x": 0.15, "i": 0.15, "f": 0.15, "h": 0.05, "y": 0.1}
+    # Fractions of a directory's budget
+    HIGH_WATERMARK = float(os.getenv("CACHE_HIGH_WATERMARK", "0.9"))
+    LOW_WATERMARK = float(os.getenv("CACHE_LOW_WATERMARK", "0.75"))
+    # Seconds without a request before a video is evicted regardless of space
+    MAX_IDLE = float(os.getenv("CACHE_MAX_IDLE", "86400"))
+    SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
+    EVICT_BATCH = int(os.getenv("CACHE_EVICT_BATCH", "256"))
+    # Of the 256 first-level shards; a full walk takes 256 / WALK_SHARDS passes
+    WALK_SHARDS = int(os.getenv("CACHE_WALK_SHARDS", "16"))
+    # Flat files moved into shards per pass
+    MIGRATE_BATCH = 5000
+    # Hits refresh a file's access time at most once per interval
+    TOUCH_INTERVAL = float(os.getenv("CACHE_TOUCH_INTERVAL", "10"))
+    # Just-served files may still be opened by their response
+    MIN_AGE = 60
+    # Wakeups within this many seconds of a pass share the next one
+    MIN_SWEEP_GAP = 1.0
+    # Leftovers of interrupted downloads (.part, .ytdl, .link files)
+    STALE_TEMP_AGE = 600
+    TEMP_MARKERS = (".part", ".ytdl", ".link", ".temp")
+    # Seconds a download waits for the admission decision when its
+    # directory is full; shorter than MIN_AGE so sweeps leave it alone
+    PROBATION = 30
+
+    _directories: Dict[str, str] = {}
+    _platforms: Dict[str, str] = {}
+    _touched: Dict[str, float] = {}
+    _usage: Dict[str, int] = {}
+    _files: Dict[str, int] = {}
+    # Bytes first served since the last pass
+    _pending: Dict[str, int] = {}
+    # Least recently accessed video per directory, as of its last pass
+    _victims: Dict[str, Optional[str]] = {}
+    _walk_cursor: Dict[str, int] = {}
+    _probation: Dict[str, asyncio.Task] = {}
+    _download: ContextVar[Optional[Download]] = ContextVar(
+        "cache_download", default=None
+    )
+    _wakeup: Optional[asyncio.Event] = None
+    _task: Optional[asyncio.Task] = None
+    sweeps = 0
+    evicted = 0
+    evicted_bytes = 0
+    migrated = 0
+
+    @staticmethod
+    def shard(video_id: str) -> str:
+        """Relative directory of a video inside its platform directory."""
+        digest = hashlib.sha1(video_id.encode()).hexdigest()
+        return os.path.join(digest[:2], digest[2:4])
+
+    @classmethod
+    def budget(cls, platform: str) -> int:
+        default = int(cls.MAX_BYTES * cls.SHARES.get(platform, 0.1))
+        return int(os.getenv(f"CACHE_{platform.upper()}_MAX_BYTES", default))
+
+    @classmethod
+    def _over_high_watermark(cls, platform: str) -> bool:
+        used = cls._usage.get(platform, 0) + cls._pending.get(platform, 0)
+        return used > cls.budget(platform) * cls.HIGH_WATERMARK
+
+    @classmethod
+    def _platform_of(cls, path: str) -> Optional[str]:
+        """Platform of a normalized cached path, sharded or flat."""
+        directory = os.path.dirname(path)
+        root = os.path.dirname(os.path.dirname(directory))
+        return cls._platforms.get(root) or cls._platforms.get(directory)
+
+    @classmethod
+    def touch(cls, path: str) -> None:
+        """Records that path was just served."""
+        path = os.path.normpath(path)
+        now = time.time()
+        last = cls._touched.get(path)
+        if last is not None and now - last < cls.TOUCH_INTERVAL:
+            return
+        try:
+            os.utime(path, (now, now))
+            # Only the first touch can mean new bytes in the directory
+            size = os.path.getsize(path) if last is None else 0
+        except OSError:
+            return
+        cls._touched[path] = now
+
+        platform = cls._platform_of(path)
+        if platform is None or not size:
+            return
+        cls._pending[platform] = cls._pending.get(platform, 0) + size
+        if cls._wakeup is not None and cls._over_high_watermark(platform):
+            cls._wakeup.set()
+
+    @classmethod
+    def record(cls, path: str, hit: bool, size: Optional[int] = None) -> None:
+        """Counts a request for path, served from the cache if hit."""
+        path = os.path.normpath(path)
+        platform = cls._platform_of(path)
+        if platform is None:
+            return
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+        capacity = int(cls.budget(platform) * cls.HIGH_WATERMARK)
+        FrequencyService.record(platform, path, size, hit, capacity)
+
+    @classmethod
+    def fetched(cls, source: str, digest: Optional[str] = None) -> None:
+        """
+        Called by downloaders after a successful fetch, with the method
+        used (e.g. "yt-dlp:tiktok") and the content digest if known.
+        """
+        download = cls._download.get()
+        if download is not None:
+            download.source = source
+            download.digest = digest
+
+    @classmethod
+    def downloaded(cls, path: str, source: Optional[str] = None) -> None:
+        """
+        Called by download chains when path was fetched from upstream.
+        source names the method if no downloader reported one.
+        """
+        download = cls._download.get()
+        if download is not None:
+            download.path = path
+            download.source = download.source or source
+
+    @classmethod
+    async def track_download(cls, func, *args) -> Tuple[Any, Download]:
+        """Runs func. Returns (its result, what it downloaded)."""
+        download = Download()
+        token = cls._download.set(download)
+        try:
+            return await func(*args), download
+        finally:
+            cls._download.reset(token)
+
+    @classmethod
+    def admit(cls, path: str, digest: Optional[str] = None) -> bool:
+        """
+        Decides whether a file that was just downloaded goes straight into
+        the cache. If its directory is full the file is put on probation
+        instead: it is served to the requests waiting on it, and after
+        PROBATION seconds, with all of them counted, it is either added to
+        the blob store or deleted. digest is the file's blob, if the
+        downloader already stored it; a deleted file releases it.
+        """
+        path = os.path.normpath(path)
+        platform = cls._platform_of(path)
+        # Room left: everything gets in, as with plain LRU
+        if platform is None or not cls._over_high_watermark(platform):
+            return True
+        if path not in cls._probation:
+            cls._probation[path] = asyncio.create_task(
+                cls._decide(path, platform, digest)
+            )
+        return False
+
+    @classmethod
+    async def _decide(cls, path: str, platform: str, digest: Optional[str]) -> None:
+        try:
+            await asyncio.sleep(cls.PROBATION)
+            if FrequencyService.admit(path, cls._victims.get(platform)):
+                await BlobStoreService.ingest(path)
+                return
+            try:
+                os.remove(path)
+            except OSError:
+                return
+            if digest:
+                BlobStoreService.release(digest)
+            cls._touched.pop(path, None)
+            HotCacheService.discard(path)
+            await IndexService.evicted(platform, [cls._video_id(path)])
+        finally:
+            cls._probation.pop(path, None)
+
+    @staticmethod
+    def _video_id(path: str) -> str:
+        return os.path.splitext(os.path.basename(path))[0]
+
+    @classmethod
+    def _is_temporary(cls, name: str) -> bool:
+        return any(marker in name for marker in cls.TEMP_MARKERS)
+
+    @classmethod
+    def _delete(cls, videos: List[VideoRecord]) -> int:
+        """Deletes the files of videos. Returns the bytes freed."""
+        freed = 0
+        for video in videos:
+            try:
+                os.remove(video.path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"Error deleting file {video.path}: {e}")
+                continue
+            freed += video.size or 0
+            cls.evicted += 1
+            if video.digest:
+                # The blob goes with its last link
+                BlobStoreService.release(video.digest)
+        cls.evicted_bytes += freed
+        return freed
+
+    @classmethod
+    async def evict(cls, platform: str, usage: int) -> int:
+        """
+        Evicts videos of platform, least recently accessed first, a batch
+        at a time. usage is the platform's indexed size in bytes.
+        Returns the number of videos evicted.
+        """
+        now = time.time()
+        idle_before = now - cls.MAX_IDLE
+        # Bytes to free: down to the low watermark once past the high one
+        excess = 0
+        if usage > cls.budget(platform) * cls.HIGH_WATERMARK:
+            excess = usage - cls.budget(platform) * cls.LOW_WATERMARK
+
+        total = 0
+        while True:
+            before = now - cls.MIN_AGE if excess > 0 else idle_before
+            coldest = await IndexService.coldest(platform, before, cls.EVICT_BATCH)
+            victims = []
+            for video in coldest:
+                if excess <= 0 and video.last_access >= idle_before:
+                    break
+                victims.append(video)
+                excess -= video.size or 0
+            if not victims:
+                break
+            freed = await ExecutorService.run("cache", cls._delete, victims)
+            await IndexService.evicted(platform, [v.video_id for v in victims])
+            for video in victims:
+                cls._touched.pop(video.path, None)
+                HotCacheService.discard(video.path)
+            usage -= freed
+            total += len(victims)
+            if len(victims) < cls.EVICT_BATCH:
+                break
+
+        cls._usage[platform] = usage
+        # TinyLFU compares new downloads against this one
+        coldest = await IndexService.coldest(platform, now, 1)
+        cls._victims[platform] = coldest[0].path if coldest else None
+        return total
+
+    @classmethod
+    def _walk(cls, platform: str, first_shard: int) -> Tuple[List[tuple], int]:
+        """
+        Moves flat files into their shards and lists WALK_SHARDS shards
+        starting at first_shard, removing stale temporary files.
+        Returns ([(video_id, path, size, last_access)], files migrated).
+        """
+        root = os.path.normpath(cls._directories[platform])
+        now = time.time()
+        found = []
+        migrated = 0
+
+        def visit(entry: os.DirEntry) -> Optional[os.stat_result]:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    return None
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                return None
+            if not cls._is_temporary(entry.name):
+                return st
+            if now - st.st_mtime > cls.STALE_TEMP_AGE:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            return None
+
+        # Files from the flat layout
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if migrated >= cls.MIGRATE_BATCH:
+                    break
+                st = visit(entry)
+                if st is None:
+                    continue
+                video_id = cls._video_id(entry.name)
+                shard_dir = os.path.join(root, cls.shard(video_id))
+                os.makedirs(shard_dir, exist_ok=True)
+                path = os.path.join(shard_dir, entry.name)
+                try:
+                    os.rename(entry.path, path)
+                except FileNotFoundError:
+                    continue
+                migrated += 1
+                last_access = max(st.st_atime, st.st_mtime)
+                found.append((video_id, path, st.st_size, last_access))
+
+        for n in range(first_shard, first_shard + cls.WALK_SHARDS):
+            outer = os.path.join(root, f"{n % 256:02x}")
+            if not os.path.isdir(outer):
+                continue
+            with os.scandir(outer) as inners:
+                shards = [e.path for e in inners if e.is_dir(follow_symlinks=False)]
+            for shard_dir in shards:
+                with os.scandir(shard_dir) as entries:
+                    for entry in entries:
+                        st = visit(entry)
+                        if st is not None:
+                            # Reads may bump atime on their own; touches set both
+                            last_access = max(st.st_atime, st.st_mtime)
+                            found.append(
+                                (
+                                    cls._video_id(entry.name),
+                                    entry.path,
+                                    st.st_size,
+                                    last_access,
+                                )
+                            )
+        return found, migrated
+
+    @classmethod
+    async def walk(cls, platform: str) -> bool:
+        """
+        Walks the next slice of platform's shards into the index.
+        Returns True when the walk wrapped around to the first shard.
+        """
+        first_shard = cls._walk_cursor.get(platform, 0)
+        found, migrated = await ExecutorService.run(
+            "cache", cls._walk, platform, first_shard
+        )
+        if found:
+            await IndexService.found(platform, found)
+        if migrated:
+            cls.migrated += migrated
+            print(
+                f"Moved {migrated} videos into shards of {cls._directories[platform]}"
+            )
+            # Keep going until the flat layout is gone
+            return False
+        cls._walk_cursor[platform] = (first_shard + cls.WALK_SHARDS) % 256
+        return cls._walk_cursor[platform] < cls.WALK_SHARDS
+
+    @classmethod
+    async def _pass(cls, platforms: List[str], walk: bool) -> None:
+        wrapped = False
+        if walk:
+            for platform in platforms:
+                async with FileLockService.lock(("cache", "sweep", platform)):
+                    wrapped = await cls.walk(platform) or wrapped
+
+        # Hits counted in memory decide the eviction order
+        await IndexService.flush()
+        usage = await IndexService.usage()
+        for platform in platforms:
+            async with FileLockService.lock(("cache", "sweep", platform)):
+                cls._pending[platform] = 0
+                size, files = usage.get(platform, (0, 0))
+                evicted = await cls.evict(platform, size)
+                cls._files[platform] = files - evicted
+            cls.sweeps += 1
+            if evicted:
+                print(f"Evicted {evicted} videos from {cls._directories[platform]}")
+        if wrapped:
+            # Blobs orphaned by anything other than eviction
+            await ExecutorService.run("cache", BlobStoreService.collect_garbage)
+
+    @classmethod
+    async def _run(cls) -> None:
+        next_full_pass = 0.0
+        while True:
+            full = time.monotonic() >= next_full_pass
+            if full:
+                platforms = list(cls._directories)
+                next_full_pass = time.monotonic() + cls.SWEEP_INTERVAL
+            else:
+                platforms = [p for p in cls._directories if cls._over_high_watermark(p)]
+
+            cls._wakeup.clear()
+            try:
+                await cls._pass(platforms, walk=full)
+            except Exception as e:
+                print(f"Error sweeping video cache: {e}")
+
+            # Touches older than this no longer throttle anything
+            cutoff = time.time() - cls.TOUCH_INTERVAL
+            cls._touched = {p: t for p, t in cls._touched.items() if t > cutoff}
+
+            await asyncio.sleep(cls.MIN_SWEEP_GAP)
+            timeout = max(0.0, next_full_pass - time.monotonic())
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def start(cls, directories: Dict[str, str]) -> None:
+        """Starts managing directories, a {platform: path} map."""
+        cls._directories = dict(directories)
+        cls._platforms = {os.path.normpath(d): p for p, d in directories.items()}
+        cls._wakeup = asyncio.Event()
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        for task in list(cls._probation.values()):
+            task.cancel()
+        cls._wakeup = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "directories": {
+                platform: {
+                    "budget": cls.budget(platform),
+                    "usage": cls._usage.get(platform, 0)
+                    + cls._pending.get(platform, 0),
+                    "files": cls._files.get(platform, 0),
+                }
+                for platform in cls._directories
+            },
+            "sweeps": cls.sweeps,
+            "evicted": cls.evicted,
+            "evicted_bytes": cls.evicted_bytes,
+            "migrated": cls.migrated,
+            "admission": FrequencyService.stats(),
+        }
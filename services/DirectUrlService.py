@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable, Set
+from services.AliasService import AliasService
+from services.IndexService import IndexService
+
+
+class DirectUrl:
+    """A resolved direct URL and how to resolve it again."""
+
+    def __init__(self, url: str, until: float):
+        self.url = url
+        self.resolved = time.time()
+        self.until = until
+        # Requests served since it was resolved
+        self.hits = 0
+        self.refresh: Optional[Callable[[], Awaitable[str]]] = None
+
+
+class DirectUrlService:
+    """
+    Cache of resolved direct video URLs for ?r= redirects. Signed CDN URLs
+    carry their own expiry (x-expires on TikTok, oe on Facebook, Instagram
+    and Threads, expire on YouTube), so each URL is kept until shortly
+    before it; URLs without one are kept for DIRECT_URL_TTL seconds.
+
+    Lookups are memory first, keyed by the ID as requested; resolved URLs
+    are also stored in IndexService under the canonical ID, so other
+    workers and other forms of the same video can reuse them.
+
+    URLs requested at least REFRESH_MIN_HITS times are resolved again in
+    the background once they enter the last REFRESH_AHEAD of their
+    lifetime, hottest first and at most REFRESH_CONCURRENCY at a time, so
+    popular videos never wait for a resolution.
+    """
+
+    # Seconds a URL without an expiry parameter is reused
+    DEFAULT_TTL = float(os.getenv("DIRECT_URL_TTL", "300"))
+    MAX_TTL = float(os.getenv("DIRECT_URL_MAX_TTL", "21600"))
+    # Clients need time to follow the redirect and finish the download
+    MARGIN = float(os.getenv("DIRECT_URL_MARGIN", "120"))
+    MAX_ENTRIES = 50000
+    REFRESH_MIN_HITS = int(os.getenv("DIRECT_URL_REFRESH_MIN_HITS", "3"))
+    # Fraction of a URL's lifetime
+    REFRESH_AHEAD = float(os.getenv("DIRECT_URL_REFRESH_AHEAD", "0.2"))
+    REFRESH_CONCURRENCY = int(os.getenv("DIRECT_URL_REFRESH_CONCURRENCY", "2"))
+    REFRESH_INTERVAL = 5
+    # Query parameter -> base of its Unix timestamp
+    EXPIRY_PARAMS = {"x-expires": 10, "expire": 10, "expires": 10, "oe": 16}
+
+    _urls: "OrderedDict[Tuple[str, str], DirectUrl]" = OrderedDict()
+    _refreshing: Set[Tuple[str, str]] = set()
+    _task: Optional[asyncio.Task] = None
+    # Running refreshes; the loop only keeps weak references to tasks
+    _refreshes: Set[asyncio.Task] = set()
+    hits = 0
+    misses = 0
+    expired = 0
+    refreshed = 0
+    refresh_errors = 0
+
+    @classmethod
+    def expiry(cls, url: str) -> Optional[float]:
+        """Unix time at which a signed URL stops working, if it says."""
+        params = parse_qs(urlparse(url).query)
+        for name, values in params.items():
+            base = cls.EXPIRY_PARAMS.get(name.lower())
+            if base is None:
+                continue
+            try:
+                expires = int(values[0], base)
+            except ValueError:
+                continue
+            # Same parameter names are used for other things elsewhere
+            if abs(expires - time.time()) < 366 * 86400:
+                return float(expires)
+        return None
+
+    @classmethod
+    def reuse_until(cls, url: str) -> float:
+        """Unix time until which url may be handed to clients."""
+        now = time.time()
+        expires = cls.expiry(url)
+        if expires is None:
+            return now + cls.DEFAULT_TTL
+        return min(expires - cls.MARGIN, now + cls.MAX_TTL)
+
+    @classmethod
+    def _remember(cls, key: Tuple[str, str], url: str, until: float) -> DirectUrl:
+        entry = DirectUrl(url, until)
+        previous = cls._urls.get(key)
+        if previous is not None:
+            entry.refresh = previous.refresh
+        cls._urls[key] = entry
+        cls._urls.move_to_end(key)
+        while len(cls._urls) > cls.MAX_ENTRIES:
+            cls._urls.popitem(last=False)
+        return entry
+
+    @classmethod
+    async def get(
+        cls,
+        platform: str,
+        request_id: str,
+        refresh: Callable[[], Awaitable[str]],
+    ) -> Optional[str]:
+        """
+        A still valid direct URL for the video, or None. refresh resolves
+        it again; it is kept for refreshing the URL ahead of its expiry.
+        """
+        now = time.time()
+        key = (platform, request_id)
+        entry = cls._urls.get(key)
+        if entry is not None:
+            if entry.until > now:
+                entry.hits += 1
+                entry.refresh = refresh
+                cls.hits += 1
+                return entry.url
+            del cls._urls[key]
+            cls.expired += 1
+
+        video_id = await AliasService.canonical(platform, request_id) or request_id
+        video = await IndexService.get(platform, video_id)
+        if (
+            video is not None
+            and video.direct_url
+            and (video.direct_url_expires or 0) > now
+        ):
+            entry = cls._remember(key, video.direct_url, video.direct_url_expires)
+            entry.hits += 1
+            entry.refresh = refresh
+            cls.hits += 1
+            return video.direct_url
+        cls.misses += 1
+        return None
+
+    @classmethod
+    async def put(cls, platform: str, request_id: str, url: str) -> None:
+        """Records that the video requested as request_id resolved to url."""
+        until = cls.reuse_until(url)
+        if until <= time.time():
+            # Too close to its expiry to be worth keeping
+            return
+        cls._remember((platform, request_id), url, until)
+        video_id = await AliasService.canonical(platform, request_id) or request_id
+        await IndexService.resolved(platform, video_id, url, until)
+
+    @classmethod
+    def _due(cls, entry: DirectUrl, now: float) -> bool:
+        if entry.refresh is None or entry.hits < cls.REFRESH_MIN_HITS:
+            return False
+        return entry.until - now < (entry.until - entry.resolved) * cls.REFRESH_AHEAD
+
+    @classmethod
+    async def _refresh(cls, key: Tuple[str, str], entry: DirectUrl) -> None:
+        try:
+            await entry.refresh()
+            cls.refreshed += 1
+        except Exception as e:
+            cls.refresh_errors += 1
+            print(f"Error refreshing direct URL of {key[0]}/{key[1]}: {e}")
+        finally:
+            # A successful refresh replaced entry; otherwise it is not
+            # retried until it is requested often enough again
+            entry.hits = 0
+            cls._refreshing.discard(key)
+
+    @classmethod
+    async def _run(cls) -> None:
+        while True:
+            await asyncio.sleep(cls.REFRESH_INTERVAL)
+            now = time.time()
+            due = [
+                (key, entry)
+                for key, entry in cls._urls.items()
+                if key not in cls._refreshing and cls._due(entry, now)
+            ]
+            due.sort(key=lambda item: item[1].hits, reverse=True)
+            slots = cls.REFRESH_CONCURRENCY - len(cls._refreshing)
+            for key, entry in due[: max(0, slots)]:
+                cls._refreshing.add(key)
+                task = asyncio.create_task(cls._refresh(key, entry))
+                cls._refreshes.add(task)
+                task.add_done_callback(cls._refreshes.discard)
+
+    @classmethod
+    def start(cls) -> None:
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        for task in list(cls._refreshes):
+            task.cancel()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "cached": len(cls._urls),
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "expired": cls.expired,
+            "refreshing": len(cls._refreshing),
+            "refreshed": cls.refreshed,
+            "refresh_errors": cls.refresh_errors,
+        }
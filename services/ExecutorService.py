@@ -0,0 +1,134 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any
+from fastapi import HTTPException
+
+
+class Bulkhead:
+    """
+    Bounded worker pool with its own wait queue. A slow provider can only
+    exhaust the bulkhead it runs in, never the pools of other platforms.
+    Coroutine functions run on the event loop under the bulkhead's limit;
+    blocking callables run in its own threads.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"bulkhead-{name}"
+        )
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a callable in this bulkhead and awaits its result.
+        Raises HTTPException 503 when the wait queue is full.
+        """
+        if self.active + self.waiting >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, try again later")
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            if asyncio.iscoroutinefunction(func):
+                result = await func(*args, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self._executor, partial(func, *args, **kwargs)
+                )
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ExecutorService:
+    """
+    Per-platform bulkheads for cold downloads (yt-dlp jobs, upstream HTTP
+    calls and file I/O), so one slow provider cannot starve the others.
+    Cache lookups and redirect resolutions are bounded by the admission
+    lanes instead, so they never wait for a download slot.
+
+    Sizes can be overridden with BULKHEAD_<NAME>_WORKERS and
+    BULKHEAD_<NAME>_QUEUE, e.g. BULKHEAD_T_WORKERS=32.
+    """
+
+    # name: (workers, queue). "root" is the catch-all TikTok route.
+    BULKHEADS = {
+        "t": (8, 32),
+        "root": (16, 64),
+        "x": (4, 16),
+        "f": (4, 16),
+        "i": (4, 16),
+        "h": (4, 16),
+        "y": (2, 8),
+        # Cache maintenance (directory sweeps)
+        "cache": (1, 4),
+        # Hashing and linking finished downloads into the blob store
+        "store": (2, 64),
+    }
+
+    _bulkheads: Dict[str, Bulkhead] = {}
+
+    @classmethod
+    def get(cls, name: str) -> Bulkhead:
+        bulkhead = cls._bulkheads.get(name)
+        if bulkhead is None:
+            workers, queue = cls.BULKHEADS[name]
+            prefix = f"BULKHEAD_{name.upper()}"
+            bulkhead = Bulkhead(
+                name,
+                max_workers=int(os.getenv(f"{prefix}_WORKERS", workers)),
+                max_queue=int(os.getenv(f"{prefix}_QUEUE", queue)),
+            )
+            cls._bulkheads[name] = bulkhead
+        return bulkhead
+
+    @classmethod
+    async def run(cls, name: str, func, *args, **kwargs):
+        """Runs a callable in the named bulkhead."""
+        return await cls.get(name).run(func, *args, **kwargs)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, Any]]:
+        return {name: cls.get(name).stats() for name in cls.BULKHEADS}
+
+    @classmethod
+    def shutdown(cls) -> None:
+        for bulkhead in cls._bulkheads.values():
+            bulkhead.shutdown()
+        cls._bulkheads.clear()
@@ -1,8 +1,8 @@
 import os
 import re
-import requests
 from fastapi import HTTPException
 from typing import Optional
+from services.HttpClientService import HttpClientService
 
 
 class VideoNotFoundError(Exception):
@@ -39,7 +39,7 @@ class FacebookService:
     }
 
     @classmethod
-    def get_video_url(cls, facebook_url: str, is_share_type: bool = False, original_share_id: Optional[str] = None) -> str:
+    async def get_video_url(cls, facebook_url: str, is_share_type: bool = False, original_share_id: Optional[str] = None) -> str:
         """
         Gets the direct video URL from a Facebook URL.
         Returns the direct video URL without downloading.
@@ -53,7 +53,7 @@ class FacebookService:
         print(f"[GET_URL] Request URL: {url}")
 
         try:
-            response = requests.get(url, headers=cls.HEADERS, timeout=30)
+            response = await HttpClientService.get(url, headers=cls.HEADERS, timeout=30)
             response.raise_for_status()
         except Exception as e:
             raise DownloadError(f"Error contacting fixacebook.com: {e}")
@@ -82,7 +82,7 @@ class FacebookService:
         return video_urls[0]
 
     @classmethod
-    def download_video_with_requests(cls, facebook_url: str, save_path: str) -> str:
+    async def download_video_with_requests(cls, facebook_url: str, save_path: str) -> str:
         """
         Descarga un video de Facebook usando la API de fsave.net como método alternativo.
         Devuelve la ruta al archivo guardado.
@@ -90,7 +90,9 @@ class FacebookService:
         """
         data = {"url": facebook_url}
         try:
-            response = requests.post(cls.FSAVE_API_URL, headers=cls.HEADERS, data=data)
+            response = await HttpClientService.post(
+                cls.FSAVE_API_URL, headers=cls.HEADERS, data=data
+            )
             response.raise_for_status()
         except Exception as e:
             raise DownloadError("Error contacting Facebook API")
@@ -107,30 +109,20 @@ class FacebookService:
         if not preview_url:
             raise VideoNotFoundError("Video not found")
 
-        # Descargar el video
+        # Descargar y guardar el video
         try:
-            video_response = requests.get(
+            await HttpClientService.download(
                 preview_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
             )
-            video_response.raise_for_status()
         except Exception as e:
             raise DownloadError("Error downloading video")
 
-        # Guardar el video
-        try:
-            with open(save_path, "wb") as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        except Exception as e:
-            raise DownloadError("Error saving video file")
-
         return save_path
 
     @classmethod
-    def download_video_from_fixacebook(cls, share_id: str, save_path: str) -> str:
+    async def download_video_from_fixacebook(cls, share_id: str, save_path: str) -> str:
         """
         Descarga un video de Facebook usando fixacebook.com para videos tipo share.
         Devuelve la ruta al archivo guardado.
@@ -139,7 +131,7 @@ class FacebookService:
         url = cls.FIXACEBOOK_URL.format(share_id=share_id)
         
         try:
-            response = requests.get(url, headers=cls.HEADERS, timeout=30)
+            response = await HttpClientService.get(url, headers=cls.HEADERS, timeout=30)
             response.raise_for_status()
         except Exception as e:
             raise DownloadError(f"Error contacting fixacebook.com: {e}")
@@ -168,29 +160,18 @@ class FacebookService:
         last_error = None
         for video_url in video_urls:
             try:
-                video_response = requests.get(
+                await HttpClientService.download(
                     video_url,
+                    save_path,
                     headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                    stream=True,
                     timeout=60,
                 )
-                video_response.raise_for_status()
-            except Exception as e:
-                last_error = e
-                print(f"Failed to download from {video_url[:50]}..., trying next URL...")
-                continue
-
-            try:
-                with open(save_path, "wb") as f:
-                    for chunk in video_response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
                 return save_path
             except Exception as e:
                 last_error = e
                 if os.path.exists(save_path):
                     os.remove(save_path)
-                print(f"Failed to save video from {video_url[:50]}..., trying next URL...")
+                print(f"Failed to download from {video_url[:50]}..., trying next URL...")
                 continue
 
         raise DownloadError(f"Failed to download video from all sources: {last_error}")
@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from typing import Dict, Any, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+
+class FileLockService:
+    """
+    Advisory cross-process locks backed by flock on files in LOCK_DIR, so
+    that with several uvicorn workers only one process works on a given
+    key at a time. Waiting is done by polling on the event loop, never by
+    blocking it. Lock files are removed on release; a waiter that ends up
+    holding a removed file notices and retries on the new one.
+    """
+
+    LOCK_DIR = os.getenv("LOCK_DIR", "./videos/.locks")
+    # Seconds to wait for another process before giving up
+    TIMEOUT = float(os.getenv("LOCK_TIMEOUT", "300"))
+    POLL_INITIAL_DELAY = 0.05
+    POLL_MAX_DELAY = 1.0
+
+    waits = 0
+    timeouts = 0
+
+    @classmethod
+    def _path(cls, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(cls.LOCK_DIR, f"{digest}.lock")
+
+    @classmethod
+    def _try_lock(cls, path: str):
+        """Returns a locked file descriptor for path, or None if it is held."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            # The previous holder may have removed the file after we opened it
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return -1
+
+    @classmethod
+    @asynccontextmanager
+    async def lock(cls, key: Hashable):
+        """
+        Holds the cross-process lock for key for the duration of the block.
+        Raises HTTPException 503 if another process holds it past TIMEOUT.
+        """
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(cls.LOCK_DIR, exist_ok=True)
+        path = cls._path(key)
+        deadline = time.monotonic() + cls.TIMEOUT
+        delay = cls.POLL_INITIAL_DELAY
+        waited = False
+        while True:
+            fd = cls._try_lock(path)
+            if fd is not None and fd >= 0:
+                break
+            if fd is None:
+                if time.monotonic() >= deadline:
+                    cls.timeouts += 1
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Video is being downloaded by another worker",
+                        headers={"Retry-After": "10"},
+                    )
+                if not waited:
+                    waited = True
+                    cls.waits += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, cls.POLL_MAX_DELAY)
+
+        try:
+            yield
+        finally:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": fcntl is not None,
+            "waits": cls.waits,
+            "timeouts": cls.timeouts,
+        }
@@ -0,0 +1,158 @@
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+class CountMinSketch:
+    """
+    Approximate request counts in a fixed amount of memory: depth rows of
+    2**width_bits one-byte counters that saturate at 15. Once sample_size
+    requests were recorded every counter is halved, so old popularity
+    fades.
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width_bits: int, depth: int = 4, sample_size: int = 0):
+        self.width_bits = width_bits
+        self.depth = depth
+        self.mask = (1 << width_bits) - 1
+        self.sample_size = sample_size or 10 << width_bits
+        self.additions = 0
+        self.resets = 0
+        self._rows = [bytearray(1 << width_bits) for _ in range(depth)]
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(
+            key.encode(), digest_size=(self.width_bits * self.depth + 7) // 8
+        )
+        h = int.from_bytes(digest.digest(), "little")
+        for row in self._rows:
+            yield row, h & self.mask
+            h >>= self.width_bits
+
+    def add(self, key: str) -> None:
+        cells = list(self._indexes(key))
+        current = min(row[i] for row, i in cells)
+        if current < self.MAX_COUNT:
+            # Conservative update: only raise the counters holding the minimum
+            for row, i in cells:
+                if row[i] == current:
+                    row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._halve()
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in self._indexes(key))
+
+    def _halve(self) -> None:
+        for n, row in enumerate(self._rows):
+            self._rows[n] = bytearray(count >> 1 for count in row)
+        self.additions //= 2
+        self.resets += 1
+
+
+class ShadowLru:
+    """
+    Keys and sizes of what a plain LRU cache of capacity bytes would hold,
+    to measure the hit ratio it would have had on the same requests.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+
+    def access(self, key: str, size: int) -> None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return
+        self.misses += 1
+        self._entries[key] = size
+        self.size += size
+        while self.size > self.capacity and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted
+
+
+class FrequencyService:
+    """
+    TinyLFU admission for the video cache. Every request is counted in a
+    count-min sketch; when the cache is full, a new download only replaces
+    the next eviction victim if it has been requested more often,
+    so a stream of one-off videos cannot push out the popular ones.
+
+    Real hit ratios are tracked per platform next to the ones a plain LRU
+    of the same size would have had, so the filter can be judged on live
+    traffic. The sketch size is 4 * 2**TINYLFU_WIDTH_BITS bytes.
+    """
+
+    WIDTH_BITS = int(os.getenv("TINYLFU_WIDTH_BITS", "16"))
+    ENABLED = os.getenv("TINYLFU_ENABLED", "1") == "1"
+
+    _sketch = CountMinSketch(WIDTH_BITS)
+    _shadows: Dict[str, ShadowLru] = {}
+    _hits: Dict[str, int] = {}
+    _misses: Dict[str, int] = {}
+    admitted = 0
+    rejected = 0
+
+    @classmethod
+    def record(cls, platform: str, key: str, size: int, hit: bool, capacity: int):
+        """Counts a request for key, served from the cache if hit."""
+        cls._sketch.add(key)
+        counts = cls._hits if hit else cls._misses
+        counts[platform] = counts.get(platform, 0) + 1
+
+        shadow = cls._shadows.get(platform)
+        if shadow is None:
+            shadow = cls._shadows[platform] = ShadowLru(capacity)
+        shadow.capacity = capacity
+        shadow.access(key, size)
+
+    @classmethod
+    def frequency(cls, key: str) -> int:
+        """Approximate recent request count of key."""
+        return cls._sketch.estimate(key)
+
+    @classmethod
+    def admit(cls, candidate: str, victim: Optional[str]) -> bool:
+        """True if candidate has been requested more often than victim."""
+        if not cls.ENABLED or victim is None:
+            return True
+        admitted = cls._sketch.estimate(candidate) > cls._sketch.estimate(victim)
+        if admitted:
+            cls.admitted += 1
+        else:
+            cls.rejected += 1
+        return admitted
+
+    @staticmethod
+    def _ratio(hits: int, misses: int) -> Optional[float]:
+        total = hits + misses
+        return round(hits / total, 4) if total else None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        platforms = {}
+        for platform, shadow in cls._shadows.items():
+            hits = cls._hits.get(platform, 0)
+            misses = cls._misses.get(platform, 0)
+            platforms[platform] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": cls._ratio(hits, misses),
+                "lru_hit_ratio": cls._ratio(shadow.hits, shadow.misses),
+            }
+        return {
+            "enabled": cls.ENABLED,
+            "admitted": cls.admitted,
+            "rejected": cls.rejected,
+            "sketch_resets": cls._sketch.resets,
+            "platforms": platforms,
+        }
@@ -0,0 +1,201 @@
+import os
+import asyncio
+from email.utils import formatdate
+from typing import Optional, Dict, Any, Set
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from services.ExecutorService import ExecutorService
+from services.FrequencyService import FrequencyService
+
+
+class HotVideo:
+    """A cached video file held in memory."""
+
+    def __init__(self, body: bytes, mtime: float, frequency: int):
+        self.body = body
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.frequency = frequency
+
+
+class MemoryResponse(Response):
+    """
+    Serves a video from memory. Like FileResponse it answers a single
+    byte range with 206; other Range headers get the whole video.
+    """
+
+    def __init__(self, video: HotVideo, media_type: str):
+        super().__init__(video.body, media_type=media_type)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["last-modified"] = video.last_modified
+
+    def _range(self, scope) -> Optional[tuple]:
+        """(start, end) of the requested range, end exclusive, or None."""
+        header = Headers(scope=scope).get("range", "")
+        unit, _, spec = header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            return None
+        first, sep, last = spec.strip().partition("-")
+        size = len(self.body)
+        try:
+            if not sep:
+                return None
+            if not first:
+                # Suffix range: the last N bytes
+                return max(0, size - int(last)), size
+            end = min(size, int(last) + 1) if last else size
+            return int(first), end
+        except ValueError:
+            return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        span = self._range(scope)
+        if span is None:
+            return await super().__call__(scope, receive, send)
+
+        start, end = span
+        size = len(self.body)
+        if start >= size or start >= end:
+            response = Response(
+                status_code=416, headers={"content-range": f"bytes */{size}"}
+            )
+        else:
+            response = Response(
+                self.body[start:end],
+                status_code=206,
+                media_type=self.media_type,
+                headers={
+                    "accept-ranges": "bytes",
+                    "content-range": f"bytes {start}-{end - 1}/{size}",
+                    "last-modified": self.headers["last-modified"],
+                },
+            )
+        await response(scope, receive, send)
+
+
+class HotCacheService:
+    """
+    In-memory tier in front of the disk cache for small, popular videos.
+    A video is promoted once FrequencyService has counted MIN_HITS requests
+    for it, and is served from memory from then on without opening the
+    file. When the tier is full, a promotion demotes the videos with the
+    lowest request counts, and only if they were requested less often
+    than the new one.
+
+    The budget is HOT_CACHE_MAX_BYTES per worker process; the launcher
+    divides the default between its workers. 0 disables the tier. Videos
+    larger than HOT_CACHE_MAX_FILE_BYTES are never promoted.
+    """
+
+    MAX_BYTES = int(os.getenv("HOT_CACHE_MAX_BYTES", str(256 * 1024**2)))
+    MAX_FILE_BYTES = int(os.getenv("HOT_CACHE_MAX_FILE_BYTES", str(8 * 1024**2)))
+    MIN_HITS = int(os.getenv("HOT_CACHE_MIN_HITS", "4"))
+
+    _videos: Dict[str, HotVideo] = {}
+    _loading: Set[str] = set()
+    # Running promotions; the loop only keeps weak references to tasks
+    _tasks: Set[asyncio.Task] = set()
+    size = 0
+    hits = 0
+    promoted = 0
+    demoted = 0
+
+    @classmethod
+    def get(cls, path: str) -> Optional[HotVideo]:
+        """The in-memory copy of the normalized path, or None."""
+        video = cls._videos.get(path)
+        if video is not None:
+            cls.hits += 1
+        return video
+
+    @classmethod
+    def consider(cls, path: str) -> None:
+        """
+        Called after path was served from disk. Loads it into memory in the
+        background once it is requested often enough.
+        """
+        if cls.MAX_BYTES <= 0 or path in cls._videos or path in cls._loading:
+            return
+        if FrequencyService.frequency(path) < cls.MIN_HITS:
+            return
+        cls._loading.add(path)
+        task = asyncio.create_task(cls._promote(path))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    def _read(cls, path: str) -> Optional[tuple]:
+        """(contents, mtime) of path, or None if it is too large."""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size > cls.MAX_FILE_BYTES:
+                return None
+            return f.read(), st.st_mtime
+
+    @classmethod
+    def _make_room(cls, size: int, frequency: int) -> bool:
+        """
+        Demotes less requested videos until size more bytes fit.
+        Returns False, demoting nothing, if that is not possible.
+        """
+        if size > cls.MAX_BYTES:
+            return False
+        needed = cls.size + size - cls.MAX_BYTES
+        if needed <= 0:
+            return True
+        # Counts change as requests come in and the sketch ages
+        for path, video in cls._videos.items():
+            video.frequency = FrequencyService.frequency(path)
+        candidates = sorted(cls._videos.items(), key=lambda item: item[1].frequency)
+        demote = []
+        for path, video in candidates:
+            if needed <= 0:
+                break
+            if video.frequency >= frequency:
+                return False
+            demote.append(path)
+            needed -= len(video.body)
+        if needed > 0:
+            return False
+        for path in demote:
+            cls.discard(path)
+            cls.demoted += 1
+        return True
+
+    @classmethod
+    async def _promote(cls, path: str) -> None:
+        try:
+            loaded = await ExecutorService.run("store", cls._read, path)
+            if loaded is None:
+                return
+            body, mtime = loaded
+            frequency = FrequencyService.frequency(path)
+            if path in cls._videos or not cls._make_room(len(body), frequency):
+                return
+            cls._videos[path] = HotVideo(body, mtime, frequency)
+            cls.size += len(body)
+            cls.promoted += 1
+        except (OSError, HTTPException):
+            # Evicted from disk meanwhile, or the bulkhead is full; the
+            # next request tries again
+            pass
+        finally:
+            cls._loading.discard(path)
+
+    @classmethod
+    def discard(cls, path: str) -> None:
+        """Drops the in-memory copy of path, e.g. when the file is evicted."""
+        video = cls._videos.pop(path, None)
+        if video is not None:
+            cls.size -= len(video.body)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "budget": cls.MAX_BYTES,
+            "bytes": cls.size,
+            "videos": len(cls._videos),
+            "hits": cls.hits,
+            "promoted": cls.promoted,
+            "demoted": cls.demoted,
+        }
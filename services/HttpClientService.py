@@ -0,0 +1,164 @@
+import os
+import asyncio
+import hashlib
+import importlib.util
+import httpx
+from urllib.parse import urlparse
+from typing import Optional, Dict
+from services.TeeService import TeeService
+from services.BlobStoreService import BlobStoreService
+from services.CacheService import CacheService
+
+
+class HttpClientService:
+    """
+    Shared async HTTP client for every service fallback. Connections are
+    pooled per host and kept alive between requests, and HTTP/2 is
+    negotiated with hosts that support it, so repeated calls to the same
+    provider skip the TCP and TLS handshake.
+    """
+
+    # Total open connections across all hosts
+    MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    # Idle connections kept open for reuse
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    # Concurrent requests in flight to a single host
+    MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+    KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+    # HTTP/2 needs the optional h2 package
+    HTTP2 = (
+        os.getenv("HTTP_HTTP2", "1") == "1"
+        and importlib.util.find_spec("h2") is not None
+    )
+
+    _client: Optional[httpx.AsyncClient] = None
+    _host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                http2=cls.HTTP2,
+                follow_redirects=True,
+                timeout=cls.TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=cls.MAX_CONNECTIONS,
+                    max_keepalive_connections=cls.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=cls.KEEPALIVE_EXPIRY,
+                ),
+            )
+        return cls._client
+
+    @classmethod
+    def _host_semaphore(cls, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        semaphore = cls._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(cls.MAX_CONNECTIONS_PER_HOST)
+            cls._host_semaphores[host] = semaphore
+        return semaphore
+
+    @classmethod
+    async def request(cls, method: str, url: str, **kwargs) -> httpx.Response:
+        """Sends a request through the shared client and reads the body."""
+        async with cls._host_semaphore(url):
+            return await cls.get_client().request(method, url, **kwargs)
+
+    @classmethod
+    async def get(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("GET", url, **kwargs)
+
+    @classmethod
+    async def post(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("POST", url, **kwargs)
+
+    @classmethod
+    async def head(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("HEAD", url, **kwargs)
+
+    @classmethod
+    async def download(
+        cls,
+        url: str,
+        save_path: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 120,
+    ) -> int:
+        """
+        Streams a remote file to save_path. The body is written to a
+        .part file that is renamed into place once complete, so readers
+        in any process never see a half-written video. Inside a
+        TeeService flight the transfer is published so requesters can
+        follow the .part file while it grows. The content is hashed on
+        the way in and the finished file is added to the blob store.
+        Returns the number of bytes written.
+        Raises httpx.HTTPError on network errors or OSError on write errors.
+        """
+        part_path = f"{save_path}.{os.getpid()}.part"
+        transfer = None
+        try:
+            async with cls._host_semaphore(url):
+                async with cls.get_client().stream(
+                    "GET", url, headers=headers, timeout=timeout
+                ) as response:
+                    response.raise_for_status()
+                    total_size = 0
+                    digest = hashlib.sha256()
+                    f = await asyncio.to_thread(open, part_path, "wb")
+                    try:
+                        transfer = TeeService.start(
+                            part_path, save_path, cls._content_length(response)
+                        )
+                        async for chunk in response.aiter_bytes():
+                            total_size += len(chunk)
+                            digest.update(chunk)
+                            await asyncio.to_thread(
+                                cls._write, f, chunk, transfer is not None
+                            )
+                            if transfer is not None:
+                                transfer.wrote(len(chunk))
+                    finally:
+                        await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.replace, part_path, save_path)
+        except BaseException as e:
+            if transfer is not None:
+                transfer.finish(e)
+            raise
+        finally:
+            await asyncio.to_thread(cls._discard, part_path)
+        if transfer is not None:
+            transfer.finish()
+        CacheService.fetched(f"http:{urlparse(url).netloc}", digest.hexdigest())
+        await BlobStoreService.ingest(save_path, digest.hexdigest())
+        return total_size
+
+    @staticmethod
+    def _write(f, chunk: bytes, flush: bool) -> None:
+        f.write(chunk)
+        # Unbuffered, so tee readers get bytes as they arrive
+        if flush:
+            f.flush()
+
+    @staticmethod
+    def _discard(part_path: str) -> None:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    @staticmethod
+    def _content_length(response: httpx.Response) -> Optional[int]:
+        """Size of the decoded body, when the upstream states it."""
+        length = response.headers.get("content-length")
+        if response.headers.get("content-encoding") or not length:
+            return None
+        try:
+            return int(length)
+        except ValueError:
+            return None
+
+    @classmethod
+    async def aclose(cls) -> None:
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+        cls._host_semaphores.clear()
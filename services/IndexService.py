@@ -0,0 +1,443 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+
+class VideoRecord:
+    """Everything known about one cached (or once cached) video."""
+
+    COLUMNS = (
+        "platform",
+        "video_id",
+        "path",
+        "size",
+        "digest",
+        "last_access",
+        "hit_count",
+        "source",
+        "direct_url",
+        "direct_url_expires",
+    )
+
+    def __init__(
+        self,
+        platform: str,
+        video_id: str,
+        path: Optional[str] = None,
+        size: Optional[int] = None,
+        digest: Optional[str] = None,
+        last_access: float = 0.0,
+        hit_count: int = 0,
+        source: Optional[str] = None,
+        direct_url: Optional[str] = None,
+        direct_url_expires: Optional[float] = None,
+    ):
+        self.platform = platform
+        self.video_id = video_id
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.last_access = last_access
+        self.hit_count = hit_count
+        self.source = source
+        self.direct_url = direct_url
+        self.direct_url_expires = direct_url_expires
+
+
+class IndexService:
+    """
+    Persistent metadata for every video the cache has held: where it is
+    stored, its size and digest, how often and how recently it was
+    served, which method fetched it and the last resolved direct URL.
+    It lives in the same SQLite file as the alias table, so a restarted
+    worker starts warm. The most recently served videos are mirrored in
+    memory; hit counts are written back in batches rather than per hit.
+    """
+
+    DB_PATH = os.getenv("INDEX_DB_PATH", "./videos/index.sqlite3")
+    MIRROR_SIZE = int(os.getenv("INDEX_MIRROR_SIZE", "20000"))
+    FLUSH_INTERVAL = float(os.getenv("INDEX_FLUSH_INTERVAL", "5"))
+    # Seconds a miss is remembered; alias forms miss on every request
+    NEGATIVE_TTL = 60
+
+    _mirror: "OrderedDict[Tuple[str, str], VideoRecord]" = OrderedDict()
+    # Hits not yet written to SQLite: key -> (count, last access)
+    _dirty: Dict[Tuple[str, str], Tuple[int, float]] = {}
+    # Keys known not to be in SQLite, until the given monotonic time
+    _absent: Dict[Tuple[str, str], float] = {}
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+    _task: Optional[asyncio.Task] = None
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def _get_conn(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            os.makedirs(os.path.dirname(cls.DB_PATH) or ".", exist_ok=True)
+            conn = sqlite3.connect(cls.DB_PATH, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                " platform TEXT NOT NULL,"
+                " video_id TEXT NOT NULL,"
+                " path TEXT,"
+                " size INTEGER,"
+                " digest TEXT,"
+                " last_access REAL NOT NULL DEFAULT 0,"
+                " hit_count INTEGER NOT NULL DEFAULT 0,"
+                " source TEXT,"
+                " direct_url TEXT,"
+                " direct_url_expires REAL,"
+                " PRIMARY KEY (platform, video_id))"
+            )
+            # Eviction order per platform, covering only videos on disk
+            conn.execute("DROP INDEX IF EXISTS videos_last_access")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS videos_cached_by_access"
+                " ON videos (platform, last_access) WHERE path IS NOT NULL"
+            )
+            conn.commit()
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def _mirror_put(cls, record: VideoRecord) -> None:
+        key = (record.platform, record.video_id)
+        cls._mirror[key] = record
+        cls._mirror.move_to_end(key)
+        while len(cls._mirror) > cls.MIRROR_SIZE:
+            cls._mirror.popitem(last=False)
+
+    @classmethod
+    def _select(cls, platform: str, video_id: str) -> Optional[VideoRecord]:
+        with cls._lock:
+            row = (
+                cls._get_conn()
+                .execute(
+                    f"SELECT {', '.join(VideoRecord.COLUMNS)} FROM videos"
+                    " WHERE platform = ? AND video_id = ?",
+                    (platform, video_id),
+                )
+                .fetchone()
+            )
+        return VideoRecord(*row) if row else None
+
+    @classmethod
+    def _select_hot(cls, limit: int) -> List[VideoRecord]:
+        with cls._lock:
+            rows = (
+                cls._get_conn()
+                .execute(
+                    f"SELECT {', '.join(VideoRecord.COLUMNS)} FROM videos"
+                    " WHERE path IS NOT NULL ORDER BY last_access DESC LIMIT ?",
+                    (limit,),
+                )
+                .fetchall()
+            )
+        return [VideoRecord(*row) for row in rows]
+
+    @classmethod
+    def _upsert(cls, record: VideoRecord) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            # Access statistics and direct URLs outlive re-downloads
+            conn.execute(
+                "INSERT INTO videos (platform, video_id, path, size, digest,"
+                " last_access, source) VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (platform, video_id) DO UPDATE SET"
+                " path = excluded.path, size = excluded.size,"
+                " digest = COALESCE(excluded.digest, digest),"
+                " last_access = MAX(last_access, excluded.last_access),"
+                " source = COALESCE(excluded.source, source)",
+                (
+                    record.platform,
+                    record.video_id,
+                    record.path,
+                    record.size,
+                    record.digest,
+                    record.last_access,
+                    record.source,
+                ),
+            )
+            conn.commit()
+
+    @classmethod
+    def _upsert_direct_url(cls, record: VideoRecord) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            conn.execute(
+                "INSERT INTO videos (platform, video_id, direct_url,"
+                " direct_url_expires) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (platform, video_id) DO UPDATE SET"
+                " direct_url = excluded.direct_url,"
+                " direct_url_expires = excluded.direct_url_expires",
+                (
+                    record.platform,
+                    record.video_id,
+                    record.direct_url,
+                    record.direct_url_expires,
+                ),
+            )
+            conn.commit()
+
+    @classmethod
+    def _upsert_found(cls, platform: str, entries: List[tuple]) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            conn.executemany(
+                "INSERT INTO videos (platform, video_id, path, size, last_access)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (platform, video_id) DO UPDATE SET"
+                " path = excluded.path, size = excluded.size,"
+                " last_access = MAX(last_access, excluded.last_access)"
+                " WHERE path IS NULL OR path != excluded.path",
+                [(platform, *entry) for entry in entries],
+            )
+            conn.commit()
+
+    @classmethod
+    def _select_coldest(
+        cls, platform: str, before: float, limit: int
+    ) -> List[VideoRecord]:
+        with cls._lock:
+            rows = (
+                cls._get_conn()
+                .execute(
+                    f"SELECT {', '.join(VideoRecord.COLUMNS)} FROM videos"
+                    " WHERE platform = ? AND path IS NOT NULL AND last_access < ?"
+                    " ORDER BY last_access LIMIT ?",
+                    (platform, before, limit),
+                )
+                .fetchall()
+            )
+        return [VideoRecord(*row) for row in rows]
+
+    @classmethod
+    def _select_usage(cls) -> Dict[str, Tuple[int, int]]:
+        with cls._lock:
+            rows = (
+                cls._get_conn()
+                .execute(
+                    "SELECT platform, COALESCE(SUM(size), 0), COUNT(*) FROM videos"
+                    " WHERE path IS NOT NULL GROUP BY platform"
+                )
+                .fetchall()
+            )
+        return {platform: (size, files) for platform, size, files in rows}
+
+    @classmethod
+    def _clear_paths(cls, platform: str, video_ids: List[str]) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            conn.executemany(
+                "UPDATE videos SET path = NULL, size = NULL"
+                " WHERE platform = ? AND video_id = ?",
+                [(platform, video_id) for video_id in video_ids],
+            )
+            conn.commit()
+
+    @classmethod
+    def _write_hits(cls, hits: Dict[Tuple[str, str], Tuple[int, float]]) -> None:
+        with cls._lock:
+            conn = cls._get_conn()
+            conn.executemany(
+                "UPDATE videos SET hit_count = hit_count + ?,"
+                " last_access = MAX(last_access, ?)"
+                " WHERE platform = ? AND video_id = ?",
+                [
+                    (count, last_access, platform, video_id)
+                    for (platform, video_id), (count, last_access) in hits.items()
+                ],
+            )
+            conn.commit()
+
+    @classmethod
+    async def get(cls, platform: str, video_id: str) -> Optional[VideoRecord]:
+        """Returns what is known about a video, or None if it was never cached."""
+        key = (platform, video_id)
+        record = cls._mirror.get(key)
+        if record is None:
+            if cls._absent.get(key, 0) > time.monotonic():
+                cls.misses += 1
+                return None
+            try:
+                record = await asyncio.to_thread(cls._select, platform, video_id)
+            except sqlite3.Error as e:
+                print(f"Error reading video index: {e}")
+                record = None
+            if record is None:
+                if len(cls._absent) >= cls.MIRROR_SIZE:
+                    cls._absent.clear()
+                cls._absent[key] = time.monotonic() + cls.NEGATIVE_TTL
+                cls.misses += 1
+                return None
+        cls._mirror_put(record)
+        cls.hits += 1
+        return record
+
+    @classmethod
+    async def put(
+        cls,
+        platform: str,
+        video_id: str,
+        path: str,
+        size: int,
+        digest: Optional[str] = None,
+        source: Optional[str] = None,
+    ) -> None:
+        """Records that a video is now cached at path."""
+        path = os.path.normpath(path)
+        record = cls._mirror.get((platform, video_id)) or VideoRecord(
+            platform, video_id
+        )
+        record.path = path
+        record.size = size
+        record.digest = digest or record.digest
+        record.source = source or record.source
+        record.last_access = time.time()
+        cls._absent.pop((platform, video_id), None)
+        cls._mirror_put(record)
+        try:
+            await asyncio.to_thread(cls._upsert, record)
+        except sqlite3.Error as e:
+            # The mirror still serves this process
+            print(f"Error saving video {platform}/{video_id} to index: {e}")
+
+    @classmethod
+    async def resolved(
+        cls, platform: str, video_id: str, url: str, expires: float
+    ) -> None:
+        """Records the direct URL of a video, usable until expires."""
+        record = await cls.get(platform, video_id) or VideoRecord(platform, video_id)
+        record.direct_url = url
+        record.direct_url_expires = expires
+        cls._absent.pop((platform, video_id), None)
+        cls._mirror_put(record)
+        try:
+            await asyncio.to_thread(cls._upsert_direct_url, record)
+        except sqlite3.Error as e:
+            print(f"Error saving direct URL of {platform}/{video_id}: {e}")
+
+    @classmethod
+    def accessed(cls, platform: str, video_id: str) -> None:
+        """Counts a hit; written to SQLite on the next flush."""
+        now = time.time()
+        record = cls._mirror.get((platform, video_id))
+        if record is not None:
+            record.hit_count += 1
+            record.last_access = now
+        count, _ = cls._dirty.get((platform, video_id), (0, 0.0))
+        cls._dirty[(platform, video_id)] = (count + 1, now)
+
+    @classmethod
+    async def found(cls, platform: str, entries: List[tuple]) -> None:
+        """
+        Records files found on disk, as (video_id, path, size, last_access)
+        tuples. Known videos only get their path updated if it changed.
+        """
+        entries = [
+            (video_id, os.path.normpath(path), size, last_access)
+            for video_id, path, size, last_access in entries
+        ]
+        for video_id, path, size, _ in entries:
+            record = cls._mirror.get((platform, video_id))
+            if record is not None:
+                record.path = path
+                record.size = size
+            cls._absent.pop((platform, video_id), None)
+        try:
+            await asyncio.to_thread(cls._upsert_found, platform, entries)
+        except sqlite3.Error as e:
+            print(f"Error updating video index: {e}")
+
+    @classmethod
+    async def coldest(
+        cls, platform: str, before: float, limit: int
+    ) -> List[VideoRecord]:
+        """
+        Returns up to limit cached videos of platform last accessed before
+        the given time, least recently accessed first.
+        """
+        try:
+            return await asyncio.to_thread(cls._select_coldest, platform, before, limit)
+        except sqlite3.Error as e:
+            print(f"Error reading video index: {e}")
+            return []
+
+    @classmethod
+    async def usage(cls) -> Dict[str, Tuple[int, int]]:
+        """Returns {platform: (bytes, files)} of the videos on disk."""
+        try:
+            return await asyncio.to_thread(cls._select_usage)
+        except sqlite3.Error as e:
+            print(f"Error reading video index: {e}")
+            return {}
+
+    @classmethod
+    async def evicted(cls, platform: str, video_ids: List[str]) -> None:
+        """Records that videos left the cache; their statistics are kept."""
+        for video_id in video_ids:
+            record = cls._mirror.get((platform, video_id))
+            if record is not None:
+                record.path = None
+                record.size = None
+        try:
+            await asyncio.to_thread(cls._clear_paths, platform, video_ids)
+        except sqlite3.Error as e:
+            print(f"Error updating video index: {e}")
+
+    @classmethod
+    async def flush(cls) -> None:
+        """Writes pending hit counts to SQLite."""
+        if not cls._dirty:
+            return
+        hits, cls._dirty = cls._dirty, {}
+        try:
+            await asyncio.to_thread(cls._write_hits, hits)
+        except sqlite3.Error as e:
+            print(f"Error saving hit counts: {e}")
+
+    @classmethod
+    async def _run(cls) -> None:
+        try:
+            for record in reversed(
+                await asyncio.to_thread(cls._select_hot, cls.MIRROR_SIZE)
+            ):
+                # Never replace what was put while this query ran
+                if (record.platform, record.video_id) not in cls._mirror:
+                    cls._mirror_put(record)
+        except sqlite3.Error as e:
+            print(f"Error loading video index: {e}")
+        while True:
+            await asyncio.sleep(cls.FLUSH_INTERVAL)
+            await cls.flush()
+
+    @classmethod
+    def start(cls) -> None:
+        """Warms the mirror with the most recently served videos."""
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        await cls.flush()
+        with cls._lock:
+            if cls._conn is not None:
+                cls._conn.close()
+                cls._conn = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "mirrored": len(cls._mirror),
+            "pending_hits": len(cls._dirty),
+            "hits": cls.hits,
+            "misses": cls.misses,
+        }
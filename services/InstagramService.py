@@ -1,7 +1,7 @@
 import os
 import re
-import requests
 from fastapi import HTTPException
+from services.HttpClientService import HttpClientService
 
 
 class VideoNotFoundError(Exception):
@@ -38,7 +38,7 @@ class InstagramService:
     }
 
     @classmethod
-    def download_video_with_requests(cls, instagram_url: str, save_path: str) -> str:
+    async def download_video_with_requests(cls, instagram_url: str, save_path: str) -> str:
         """
         Downloads Instagram video using the savegram.app API as a fallback method.
         Returns the path to the saved video file.
@@ -55,7 +55,7 @@ class InstagramService:
         }
 
         try:
-            response = requests.post(
+            response = await HttpClientService.post(
                 cls.SAVEGRAM_API_URL, headers=cls.HEADERS, data=data
             )
             response.raise_for_status()
@@ -83,30 +83,20 @@ class InstagramService:
 
         download_url = match.group(1)
 
-        # Download the video content
+        # Download the video content to save_path
         try:
-            video_response = requests.get(
+            await HttpClientService.download(
                 download_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
             )
-            video_response.raise_for_status()
         except Exception as e:
             raise DownloadError("Error downloading video")
 
-        # Save the video content to save_path
-        try:
-            with open(save_path, "wb") as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        except Exception as e:
-            raise DownloadError("Error saving video file")
-
         return save_path
 
     @classmethod
-    def get_video_url(cls, instagram_url: str) -> str:
+    async def get_video_url(cls, instagram_url: str) -> str:
         """
         Gets the direct video URL from an Instagram URL.
         Returns the direct video URL without downloading.
@@ -124,7 +114,7 @@ class InstagramService:
         print(f"[GET_URL] Request URL: {vx_url}")
 
         try:
-            response = requests.get(
+            response = await HttpClientService.get(
                 vx_url,
                 headers={
                     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0",
@@ -170,7 +160,7 @@ class InstagramService:
         return download_url
 
     @classmethod
-    def download_video_with_vxinstagram(
+    async def download_video_with_vxinstagram(
         cls, instagram_url: str, save_path: str
     ) -> str:
         """
@@ -190,7 +180,7 @@ class InstagramService:
         print(f"[VXINSTAGRAM] Request URL: {vx_url}")
 
         try:
-            response = requests.get(
+            response = await HttpClientService.get(
                 vx_url,
                 headers={
                     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0",
@@ -235,24 +225,15 @@ class InstagramService:
         print(f"[VXINSTAGRAM] Download URL: {download_url}")
 
         try:
-            video_response = requests.get(
+            await HttpClientService.download(
                 download_url,
+                save_path,
                 headers={
                     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0"
                 },
-                stream=True,
                 timeout=120,
             )
-            video_response.raise_for_status()
         except Exception as e:
             raise DownloadError("Error downloading video")
 
-        try:
-            with open(save_path, "wb") as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        except Exception as e:
-            raise DownloadError("Error saving video file")
-
         return save_path
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+
+class LoopMonitorService:
+    """
+    Continuously samples event-loop lag (how late a timer fires compared to
+    when it was scheduled) into a histogram. In debug mode a watchdog thread
+    also captures the stack and route of any callback that holds the loop
+    longer than BLOCK_THRESHOLD.
+    """
+
+    # Seconds between lag samples
+    INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    # Upper bounds (seconds) of the lag histogram buckets
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "0") == "1"
+    # Seconds the loop must be held before the watchdog records a stack
+    BLOCK_THRESHOLD = float(os.getenv("LOOP_MONITOR_BLOCK_THRESHOLD", "0.25"))
+    MAX_REPORTS = int(os.getenv("LOOP_MONITOR_MAX_REPORTS", "50"))
+
+    _bucket_counts: List[int] = [0] * (len(BUCKETS) + 1)
+    _samples = 0
+    _lag_sum = 0.0
+    _lag_max = 0.0
+
+    _heartbeat = 0.0
+    _loop_thread_id: Optional[int] = None
+    _current_report: Optional[Dict[str, Any]] = None
+    _reports: deque = deque(maxlen=MAX_REPORTS)
+    _task: Optional[asyncio.Task] = None
+    _watchdog: Optional[threading.Thread] = None
+    _stopping = threading.Event()
+
+    @classmethod
+    def start(cls) -> None:
+        cls._loop_thread_id = threading.get_ident()
+        cls._heartbeat = time.monotonic()
+        cls._stopping.clear()
+        cls._task = asyncio.create_task(cls._sample())
+        if cls.DEBUG:
+            cls._watchdog = threading.Thread(
+                target=cls._watch, name="loop-watchdog", daemon=True
+            )
+            cls._watchdog.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stopping.set()
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def _sample(cls) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + cls.INTERVAL
+            await asyncio.sleep(cls.INTERVAL)
+            lag = max(0.0, loop.time() - scheduled)
+            cls._heartbeat = time.monotonic()
+            cls._record(lag)
+
+            report = cls._current_report
+            if report is not None:
+                # The blocking callback has returned; store how long it held the loop
+                report["blocked_seconds"] = round(lag, 4)
+                cls._current_report = None
+
+    @classmethod
+    def _record(cls, lag: float) -> None:
+        index = len(cls.BUCKETS)
+        for i, bound in enumerate(cls.BUCKETS):
+            if lag <= bound:
+                index = i
+                break
+        cls._bucket_counts[index] += 1
+        cls._samples += 1
+        cls._lag_sum += lag
+        cls._lag_max = max(cls._lag_max, lag)
+
+    @classmethod
+    def _watch(cls) -> None:
+        """Watchdog thread: detects a stalled loop and records what it runs."""
+        check_every = min(cls.BLOCK_THRESHOLD, cls.INTERVAL) / 2
+        while not cls._stopping.wait(check_every):
+            stalled = time.monotonic() - cls._heartbeat - cls.INTERVAL
+            if stalled < cls.BLOCK_THRESHOLD or cls._current_report is not None:
+                continue
+
+            frame = sys._current_frames().get(cls._loop_thread_id)
+            if frame is None:
+                continue
+            report = {
+                "detected_at": time.time(),
+                "blocked_seconds": None,
+                "route": cls._find_route(frame),
+                "stack": traceback.format_stack(frame),
+            }
+            cls._current_report = report
+            cls._reports.append(report)
+            print(
+                f"[LOOP] Event loop blocked for >{cls.BLOCK_THRESHOLD}s "
+                f"in {report['route'] or 'unknown route'}"
+            )
+
+    @staticmethod
+    def _find_route(frame) -> Optional[str]:
+        """Walks the stack looking for the ASGI scope of the current request."""
+        while frame is not None:
+            scope = frame.f_locals.get("scope")
+            if isinstance(scope, dict) and "path" in scope:
+                return f"{scope.get('method', '')} {scope['path']}".strip()
+            frame = frame.f_back
+        return None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(cls.BUCKETS, cls._bucket_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = cumulative + cls._bucket_counts[-1]
+
+        return {
+            "lag_seconds": {
+                "buckets": buckets,
+                "count": cls._samples,
+                "sum": round(cls._lag_sum, 4),
+                "max": round(cls._lag_max, 4),
+            },
+            "debug": cls.DEBUG,
+            "blocked_callbacks": list(cls._reports),
+        }
@@ -0,0 +1,100 @@
+import os
+import time
+from typing import Optional, Dict, Any, Hashable, Tuple
+from fastapi import HTTPException
+from services.TiktokService import VideoNotFoundError as TiktokVideoNotFound
+from services.XService import VideoNotFoundError as XVideoNotFound
+from services.InstagramService import VideoNotFoundError as InstagramVideoNotFound
+from services.FacebookService import VideoNotFoundError as FacebookVideoNotFound
+from services.ThreadsService import VideoNotFoundError as ThreadsVideoNotFound
+from services.YoutubeService import VideoNotFoundError as YoutubeVideoNotFound
+
+
+class NegativeCacheService:
+    """
+    Remembers failed downloads and resolutions for a while, so repeated
+    requests for a video that is gone fail fast instead of running the
+    whole fallback chain again. Keys are the same canonical keys the
+    single flights use.
+
+    A chain that failed because a service reported the video missing
+    answers 404 for NEGATIVE_CACHE_NOT_FOUND_TTL seconds; any other
+    failure (private, not downloadable, upstream errors) answers 410 for
+    the shorter NEGATIVE_CACHE_UNAVAILABLE_TTL. Our own overload (429,
+    503) is never cached.
+    """
+
+    NOT_FOUND_TTL = float(os.getenv("NEGATIVE_CACHE_NOT_FOUND_TTL", "600"))
+    UNAVAILABLE_TTL = float(os.getenv("NEGATIVE_CACHE_UNAVAILABLE_TTL", "30"))
+    MAX_ENTRIES = 100000
+    NOT_FOUND_ERRORS = (
+        TiktokVideoNotFound,
+        XVideoNotFound,
+        InstagramVideoNotFound,
+        FacebookVideoNotFound,
+        ThreadsVideoNotFound,
+        YoutubeVideoNotFound,
+    )
+
+    # key -> (monotonic expiry, status code, detail)
+    _failures: Dict[Hashable, Tuple[float, int, str]] = {}
+    hits = 0
+    not_found = 0
+    unavailable = 0
+
+    @classmethod
+    def _classify(cls, error: BaseException) -> Optional[int]:
+        """Status code to cache for error, or None to not cache it."""
+        if isinstance(error, HTTPException) and error.status_code in (429, 503):
+            return None
+        # Chains wrap the error of their last fallback
+        seen = 0
+        while error is not None and seen < 8:
+            if isinstance(error, cls.NOT_FOUND_ERRORS):
+                return 404
+            if isinstance(error, HTTPException) and error.status_code == 404:
+                return 404
+            error = error.__cause__ or error.__context__
+            seen += 1
+        return 410
+
+    @classmethod
+    def check(cls, key: Hashable) -> None:
+        """Raises the cached failure for key, if there is one."""
+        failure = cls._failures.get(key)
+        if failure is None:
+            return
+        expires, status_code, detail = failure
+        if expires <= time.monotonic():
+            del cls._failures[key]
+            return
+        cls.hits += 1
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    @classmethod
+    def record(cls, key: Hashable, error: BaseException) -> None:
+        """Remembers that key failed with error."""
+        status_code = cls._classify(error)
+        if status_code is None:
+            return
+        if status_code == 404:
+            ttl, detail = cls.NOT_FOUND_TTL, "Video not found"
+            cls.not_found += 1
+        else:
+            ttl, detail = cls.UNAVAILABLE_TTL, "Video unavailable"
+            cls.unavailable += 1
+        if len(cls._failures) >= cls.MAX_ENTRIES:
+            now = time.monotonic()
+            cls._failures = {k: f for k, f in cls._failures.items() if f[0] > now}
+            if len(cls._failures) >= cls.MAX_ENTRIES:
+                cls._failures.clear()
+        cls._failures[key] = (time.monotonic() + ttl, status_code, detail)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "cached": len(cls._failures),
+            "hits": cls.hits,
+            "not_found": cls.not_found,
+            "unavailable": cls.unavailable,
+        }
@@ -0,0 +1,187 @@
+import os
+import math
+import time
+import itertools
+from contextvars import ContextVar
+from fastapi import HTTPException
+from typing import Optional, Dict, Any, Tuple
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst; each request takes one."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """
+        Takes a token if one is available.
+        Returns 0 on success, otherwise the seconds until the next token.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        """True once the bucket would be full again, so it can be dropped."""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class RateLimitService:
+    """
+    Per-client token buckets for the download endpoints, one per platform
+    prefix. Clients are keyed by the socket peer address. Behind a proxy,
+    set RATE_LIMIT_FORWARDED_HEADER (e.g. X-Forwarded-For) and
+    RATE_LIMIT_TRUSTED_HOPS to the number of proxies that append to it:
+    the address that many entries from the right is the one the nearest
+    untrusted hop connected from. Entries further left are written by the
+    client and never used. The client of the current request is also
+    exposed through current_client, so the admission lanes can queue
+    fairly per client.
+
+    Only requests that go upstream are charged, through charge(): cache
+    hits and reused direct URLs cost nothing. Limiting is off unless
+    RATE_LIMIT_FORWARDED_HEADER is set, because behind a proxy the peer
+    is the proxy and every client would share one bucket; set
+    RATE_LIMIT_ENABLED=1 to key by peer when clients connect directly.
+
+    Limits can be overridden with RATE_LIMIT_<PREFIX>_RATE (tokens per
+    second) and RATE_LIMIT_<PREFIX>_BURST, e.g. RATE_LIMIT_T_BURST=100.
+    """
+
+    # Header holding the real client address; empty to always use the peer
+    FORWARDED_HEADER = os.getenv("RATE_LIMIT_FORWARDED_HEADER", "")
+    ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1" if FORWARDED_HEADER else "0") == "1"
+    # Proxies in front of us that append to FORWARDED_HEADER
+    TRUSTED_HOPS = max(1, int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", "1")))
+    # Buckets kept; idle ones are pruned first, then the oldest
+    MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+    # prefix: (rate, burst). "root" is the catch-all TikTok route.
+    LIMITS = {
+        "t": (1, 30),
+        "root": (1, 30),
+        "x": (0.5, 20),
+        "f": (0.5, 20),
+        "i": (0.5, 20),
+        "h": (0.5, 20),
+        "y": (0.2, 10),
+    }
+
+    # Paths that are not download endpoints
+    EXEMPT_PATHS = {"/", "/ping", "/stats", "/favicon.ico"}
+
+    current_client: ContextVar[str] = ContextVar("current_client", default="")
+    # Prefix the current request is charged to; None once charged or exempt
+    current_prefix: ContextVar[Optional[str]] = ContextVar(
+        "current_prefix", default=None
+    )
+
+    _limits: Dict[str, Tuple[float, float]] = {}
+    _buckets: Dict[Tuple[str, str], TokenBucket] = {}
+    limited = 0
+
+    @classmethod
+    def get_limit(cls, prefix: str) -> Tuple[float, float]:
+        limit = cls._limits.get(prefix)
+        if limit is None:
+            rate, burst = cls.LIMITS[prefix]
+            env = f"RATE_LIMIT_{prefix.upper()}"
+            limit = (
+                float(os.getenv(f"{env}_RATE", rate)),
+                float(os.getenv(f"{env}_BURST", burst)),
+            )
+            cls._limits[prefix] = limit
+        return limit
+
+    @classmethod
+    def prefix_for(cls, path: str) -> Optional[str]:
+        """Returns the platform prefix of a download path, or None if exempt."""
+        if path in cls.EXEMPT_PATHS:
+            return None
+        prefix = path.lstrip("/").split("/", 1)[0]
+        return prefix if prefix in cls.LIMITS and prefix != "root" else "root"
+
+    @classmethod
+    def client_key(cls, headers, peer: Optional[str]) -> str:
+        if cls.FORWARDED_HEADER:
+            forwarded = headers.get(cls.FORWARDED_HEADER)
+            if forwarded:
+                entries = [e.strip() for e in forwarded.split(",") if e.strip()]
+                # Fewer entries than proxies: the header did not come from them
+                if len(entries) >= cls.TRUSTED_HOPS:
+                    return entries[-cls.TRUSTED_HOPS]
+        return peer or "unknown"
+
+    @classmethod
+    def check(cls, client: str, prefix: str) -> float:
+        """
+        Charges one request to the client's bucket for prefix.
+        Returns 0 if allowed, otherwise the seconds until it may retry.
+        """
+        if not cls.ENABLED:
+            return 0.0
+
+        key = (client, prefix)
+        bucket = cls._buckets.get(key)
+        if bucket is None:
+            if len(cls._buckets) >= cls.MAX_CLIENTS:
+                cls._prune()
+            bucket = TokenBucket(*cls.get_limit(prefix))
+            cls._buckets[key] = bucket
+
+        retry_after = bucket.take()
+        if retry_after:
+            cls.limited += 1
+        return retry_after
+
+    @classmethod
+    def charge(cls) -> None:
+        """
+        Charges the current request, which is about to go upstream. Does
+        nothing if it was charged already or its path is exempt.
+        Raises HTTPException 429 with Retry-After when over the limit.
+        """
+        prefix = cls.current_prefix.get()
+        if prefix is None:
+            return
+        cls.current_prefix.set(None)
+        retry_after = cls.check(cls.current_client.get(), prefix)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    @classmethod
+    def _prune(cls) -> None:
+        now = time.monotonic()
+        for key in [k for k, b in cls._buckets.items() if b.is_idle(now)]:
+            del cls._buckets[key]
+        # Still full of active clients: forget the oldest buckets
+        excess = len(cls._buckets) - cls.MAX_CLIENTS + 1
+        for key in list(itertools.islice(cls._buckets, max(0, excess))):
+            del cls._buckets[key]
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": cls.ENABLED,
+            "limits": {
+                prefix: dict(zip(("rate", "burst"), cls.get_limit(prefix)))
+                for prefix in cls.LIMITS
+            },
+            "clients": len(cls._buckets),
+            "limited": cls.limited,
+        }
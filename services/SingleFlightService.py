@@ -0,0 +1,62 @@
+import asyncio
+from typing import Dict, Any, Hashable
+from services.FileLockService import FileLockService
+
+
+class SingleFlightService:
+    """
+    Coalesces concurrent calls for the same key: the first caller (leader)
+    starts the work and every caller that arrives while it is in flight
+    (follower) awaits the same result or error. The work is shielded, so a
+    client that disconnects does not cancel it for the others.
+    """
+
+    _flights: Dict[Hashable, asyncio.Task] = {}
+    leaders = 0
+    followers = 0
+
+    @classmethod
+    async def do(cls, key: Hashable, func, *args, **kwargs):
+        """
+        Runs the coroutine function func once per key at a time.
+        Returns its result, or raises its exception, to every caller.
+        """
+        task = cls._flights.get(key)
+        if task is None:
+            task = asyncio.create_task(func(*args, **kwargs))
+            cls._flights[key] = task
+            task.add_done_callback(lambda t: cls._finish(key, t))
+            cls.leaders += 1
+        else:
+            cls.followers += 1
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def do_exclusive(cls, key: Hashable, func, *args, **kwargs):
+        """
+        Like do(), but the leader also holds the cross-process lock for key,
+        so only one worker process runs func for it at a time. Callers in
+        other processes wait and then see the finished result on disk.
+        """
+
+        async def locked():
+            async with FileLockService.lock(key):
+                return await func(*args, **kwargs)
+
+        return await cls.do(key, locked)
+
+    @classmethod
+    def _finish(cls, key: Hashable, task: asyncio.Task) -> None:
+        if cls._flights.get(key) is task:
+            del cls._flights[key]
+        # Mark the error as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "in_flight": len(cls._flights),
+            "leaders": cls.leaders,
+            "followers": cls.followers,
+        }
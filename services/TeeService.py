@@ -0,0 +1,143 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Hashable, AsyncIterator
+
+
+class Transfer:
+    """
+    A download in progress. The writer reports every chunk it flushes to
+    part_path; readers follow the growing file until the writer finishes.
+    """
+
+    def __init__(self, part_path: str, final_path: str, total: Optional[int]):
+        self.part_path = part_path
+        self.final_path = final_path
+        self.total = total
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def wrote(self, n: int) -> None:
+        self.size += n
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _open(self):
+        try:
+            return open(self.part_path, "rb")
+        except FileNotFoundError:
+            # Finished and renamed before we got here
+            if self.error is not None:
+                raise
+            return open(self.final_path, "rb")
+
+    async def follow(self, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+        """
+        Yields the file from the start, waiting for new bytes as they land.
+        Raises the writer's error if the download fails midway.
+        """
+        f = await asyncio.to_thread(self._open)
+        try:
+            sent = 0
+            while True:
+                changed = self._changed
+                if sent < self.size:
+                    chunk = await asyncio.to_thread(
+                        f.read, min(chunk_size, self.size - sent)
+                    )
+                    if chunk:
+                        sent += len(chunk)
+                        yield chunk
+                        continue
+                if self.error is not None:
+                    raise IOError(f"Download failed midway: {self.error!r}")
+                if self.done and sent >= self.size:
+                    return
+                await changed.wait()
+        finally:
+            f.close()
+
+
+class TeeService:
+    """
+    Lets requesters of a cold video start receiving bytes as soon as the
+    upstream download starts instead of when it ends. A flight run through
+    run() tags its downloads with its key; HttpClientService.download then
+    publishes each transfer under that key and every requester waiting on
+    the flight can follow it.
+    """
+
+    _current_key: ContextVar[Optional[Hashable]] = ContextVar("tee_key", default=None)
+    _started: Dict[Hashable, asyncio.Future] = {}
+    streamed = 0
+
+    @classmethod
+    def _started_future(cls, key: Hashable) -> asyncio.Future:
+        future = cls._started.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            cls._started[key] = future
+        return future
+
+    @classmethod
+    async def run(cls, key: Hashable, func, *args, **kwargs):
+        """Runs func with its downloads published under key."""
+        token = cls._current_key.set(key)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            cls._current_key.reset(token)
+            cls._started.pop(key, None)
+
+    @classmethod
+    def start(
+        cls, part_path: str, final_path: str, total: Optional[int]
+    ) -> Optional[Transfer]:
+        """
+        Called by the downloader when bytes start flowing.
+        Returns the transfer to report progress on, or None outside run().
+        """
+        key = cls._current_key.get()
+        if key is None:
+            return None
+        transfer = Transfer(part_path, final_path, total)
+        future = cls._started_future(key)
+        if future.done():
+            # A previous method failed; later requesters follow this one
+            future = asyncio.get_running_loop().create_future()
+            cls._started[key] = future
+        future.set_result(transfer)
+        return transfer
+
+    @classmethod
+    async def wait(cls, key: Hashable, flight: asyncio.Future) -> Optional[Transfer]:
+        """
+        Waits until the flight for key either starts a transfer or ends.
+        Returns the transfer, or None if the flight finished without one.
+        """
+        while True:
+            future = cls._started_future(key)
+            await asyncio.wait({future, flight}, return_when=asyncio.FIRST_COMPLETED)
+            if cls._started.get(key) is future and (
+                not future.done() or future.result().error is not None
+            ):
+                # Nothing to follow yet, or that method already failed
+                del cls._started[key]
+            if future.done() and future.result().error is None:
+                cls.streamed += 1
+                return future.result()
+            if flight.done():
+                return None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {"active": len(cls._started), "streamed": cls.streamed}
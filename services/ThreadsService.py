@@ -1,10 +1,14 @@
+import os
 import re
-import requests
 import html
 import time
+import asyncio
+import httpx
 import urllib.parse
 from fastapi import HTTPException
 import json
+from typing import Dict, Tuple
+from services.HttpClientService import HttpClientService
 
 
 class VideoNotFoundError(Exception):
@@ -60,6 +64,21 @@ class ThreadsService:
         "TE": "trailers",
     }
 
+    # Polling de jobs de Publer: espera inicial, factor de crecimiento,
+    # espera máxima entre consultas y tiempo total máximo (segundos)
+    PUBLER_POLL_INITIAL_DELAY = float(os.getenv("PUBLER_POLL_INITIAL_DELAY", "0.5"))
+    PUBLER_POLL_BACKOFF = float(os.getenv("PUBLER_POLL_BACKOFF", "1.5"))
+    PUBLER_POLL_MAX_DELAY = float(os.getenv("PUBLER_POLL_MAX_DELAY", "3"))
+    PUBLER_POLL_TIMEOUT = float(os.getenv("PUBLER_POLL_TIMEOUT", "12"))
+    # Tiempo que se reutiliza la ruta de un job completado
+    PUBLER_RESULT_TTL = float(os.getenv("PUBLER_RESULT_TTL", "1800"))
+    # Resultados guardados como máximo
+    PUBLER_RESULTS_MAX = 5000
+
+    # Jobs en curso y resultados completados, por URL del post
+    _publer_jobs: Dict[str, asyncio.Future] = {}
+    _publer_results: Dict[str, Tuple[str, float]] = {}
+
     JOB_STATUS_HEADERS = {
         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:147.0) Gecko/20100101 Firefox/147.0",
         "Accept": "application/json, text/plain, */*",
@@ -95,7 +114,7 @@ class ThreadsService:
     }
 
     @classmethod
-    def get_video_url(cls, thread_code: str) -> str:
+    async def get_video_url(cls, thread_code: str) -> str:
         """
         Gets the direct video URL from a Threads post ID.
         Returns the direct video URL without downloading.
@@ -106,7 +125,7 @@ class ThreadsService:
         print(f"[GET_URL] Fetching HTML from: {full_thread_url}")
         
         try:
-            html_content = cls.fetch_html(full_thread_url)
+            html_content = await cls.fetch_html(full_thread_url)
             video_url = cls.obtener_video_threads(html_content)
             print(f"[GET_URL] Video URL: {video_url}")
             return video_url
@@ -118,7 +137,7 @@ class ThreadsService:
             raise DownloadError(f"Error getting video URL: {str(e)}")
 
     @classmethod
-    def fetch_html(cls, url: str) -> str:
+    async def fetch_html(cls, url: str) -> str:
         """
         Obtiene el contenido HTML de una URL de Threads.
 
@@ -132,10 +151,10 @@ class ThreadsService:
             DownloadError: Si hay error al hacer la petición
         """
         try:
-            response = requests.get(url, headers=cls.HEADERS)
+            response = await HttpClientService.get(url, headers=cls.HEADERS)
             response.raise_for_status()
             return response.text
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise DownloadError("Error contacting Threads API")
 
     @classmethod
@@ -196,21 +215,51 @@ class ThreadsService:
         raise VideoNotFoundError("Video not found")
 
     @classmethod
-    def _download_with_publer(cls, thread_url: str, save_path: str) -> str:
+    async def _get_publer_media_url(cls, thread_url: str) -> str:
         """
-        Método de respaldo usando la API de Publer.
-        1. Crea el job.
-        2. Consulta el estado cada 2 segundos (max 6 intentos).
-        3. Descarga usando el worker.
+        Obtiene la URL del video en Publer para un post.
+
+        Reutiliza el resultado de un job completado mientras no caduque y,
+        si ya hay un job en curso para la misma URL, espera a ese mismo job
+        en lugar de crear otro.
         """
-        print("Iniciando descarga alternativa con Publer...")
+        cached = cls._publer_results.get(thread_url)
+        if cached and cached[1] > time.monotonic():
+            print("Publer: reutilizando resultado de un job anterior")
+            return cached[0]
+        if cached:
+            del cls._publer_results[thread_url]
+
+        task = cls._publer_jobs.get(thread_url)
+        if task is None:
+            task = asyncio.ensure_future(cls._run_publer_job(thread_url))
+            cls._publer_jobs[thread_url] = task
+
+            def _forget(finished):
+                if cls._publer_jobs.get(thread_url) is finished:
+                    del cls._publer_jobs[thread_url]
+
+            task.add_done_callback(_forget)
+        else:
+            print("Publer: uniéndose a un job en curso")
 
+        # shield: si un cliente se desconecta, el job sigue para los demás
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _run_publer_job(cls, thread_url: str) -> str:
+        """
+        Crea un job en Publer y consulta su estado con espera creciente
+        hasta que termina o se agota PUBLER_POLL_TIMEOUT.
+        """
         # --- Peticion 1: Crear Job ---
         job_url = "https://app.publer.com/tools/media"
         payload = {"url": thread_url, "token": cls.PUBLER_TOKEN, "macOS": False}
 
         try:
-            response = requests.post(job_url, json=payload, headers=cls.PUBLER_HEADERS)
+            response = await HttpClientService.post(
+                job_url, json=payload, headers=cls.PUBLER_HEADERS
+            )
             response.raise_for_status()
             job_data = response.json()
             job_id = job_data.get("job_id")
@@ -222,21 +271,23 @@ class ThreadsService:
             print(f"Publer Error al crear job: {e}")
             raise DownloadError("Error contacting Threads API")
 
-        # --- Peticion 2: Polling del estado ---
+        # --- Peticion 2: Polling del estado con backoff adaptativo ---
         job_status_url = f"https://app.publer.com/api/v1/job_status/{job_id}"
-        video_url = None
+        deadline = time.monotonic() + cls.PUBLER_POLL_TIMEOUT
+        delay = cls.PUBLER_POLL_INITIAL_DELAY
+        attempt = 0
 
-        for attempt in range(6):
+        while True:
+            attempt += 1
             try:
-                if attempt > 0:
-                    time.sleep(2)
-
-                response = requests.get(job_status_url, headers=cls.JOB_STATUS_HEADERS)
+                response = await HttpClientService.get(
+                    job_status_url, headers=cls.JOB_STATUS_HEADERS
+                )
                 response.raise_for_status()
                 status_data = response.json()
                 status = status_data.get("status")
 
-                print(f"Publer Status (Intento {attempt+1}/6): {status}")
+                print(f"Publer Status (Intento {attempt}): {status}")
 
                 if status == "complete":
                     payload_data = status_data.get("payload", [])
@@ -246,18 +297,52 @@ class ThreadsService:
                             "path"
                         ):
                             video_url = video_entry["path"]
-                            break
-                elif status == "working":
-                    continue
-                else:
-                    continue
+                            cls._remember_publer_result(thread_url, video_url)
+                            return video_url
+                    # Completo pero sin video: no tiene sentido seguir
+                    raise VideoNotFoundError("Video not found")
 
+            except VideoNotFoundError:
+                raise
             except Exception as e:
-                print(f"Error en polling Publer intento {attempt+1}: {e}")
-                continue
+                print(f"Error en polling Publer intento {attempt}: {e}")
 
-        if not video_url:
-            raise DownloadError("Failed to download video")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DownloadError("Failed to download video")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * cls.PUBLER_POLL_BACKOFF, cls.PUBLER_POLL_MAX_DELAY)
+
+    @classmethod
+    def _remember_publer_result(cls, thread_url: str, video_url: str) -> None:
+        """
+        Guarda la ruta de un job completado. Con la caché llena descarta
+        primero los resultados caducados y, si no basta, los más antiguos.
+        """
+        if len(cls._publer_results) >= cls.PUBLER_RESULTS_MAX:
+            now = time.monotonic()
+            cls._publer_results = {
+                url: result
+                for url, result in cls._publer_results.items()
+                if result[1] > now
+            }
+            while len(cls._publer_results) >= cls.PUBLER_RESULTS_MAX:
+                del cls._publer_results[next(iter(cls._publer_results))]
+        cls._publer_results[thread_url] = (
+            video_url,
+            time.monotonic() + cls.PUBLER_RESULT_TTL,
+        )
+
+    @classmethod
+    async def _download_with_publer(cls, thread_url: str, save_path: str) -> str:
+        """
+        Método de respaldo usando la API de Publer.
+        1. Obtiene la URL del video (job reutilizado o nuevo, con polling).
+        2. Descarga usando el worker.
+        """
+        print("Iniciando descarga alternativa con Publer...")
+
+        video_url = await cls._get_publer_media_url(thread_url)
 
         # --- Peticion 3: Descargar video del worker ---
         encoded_video_url = urllib.parse.quote(video_url)
@@ -265,25 +350,21 @@ class ThreadsService:
 
         try:
             print("Descargando video desde Publer worker...")
-            video_response = requests.get(
+            await HttpClientService.download(
                 download_worker_url,
+                save_path,
                 headers=cls.DOWNLOAD_WORKER_HEADERS,
-                stream=True,
             )
-            video_response.raise_for_status()
-
-            with open(save_path, "wb") as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
 
             return save_path
 
         except Exception as e:
+            # La ruta puede haber caducado antes que nuestro TTL
+            cls._publer_results.pop(thread_url, None)
             raise DownloadError("Error downloading video")
 
     @classmethod
-    def download_video(cls, thread_code: str, save_path: str) -> str:
+    async def download_video(cls, thread_code: str, save_path: str) -> str:
         """
         Método principal para descargar un video de Threads.
 
@@ -306,7 +387,7 @@ class ThreadsService:
         try:
             # Paso 1: Obtener HTML
             print("Obteniendo HTML de Threads...")
-            html_content = cls.fetch_html(full_thread_url)
+            html_content = await cls.fetch_html(full_thread_url)
 
             # Paso 2: Extraer URL del video
             print("Extrayendo URL del video...")
@@ -315,17 +396,11 @@ class ThreadsService:
 
             # Paso 3: Descargar video
             print("Descargando video...")
-            video_response = requests.get(
+            await HttpClientService.download(
                 video_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
             )
-            video_response.raise_for_status()
-
-            with open(save_path, "wb") as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
 
             print(f"Descarga exitosa: {save_path}")
             return save_path
@@ -339,4 +414,4 @@ class ThreadsService:
         except Exception as e:
             # Para cualquier otro error, usar Publer como fallback
             print(f"Método principal falló ({str(e)}). Cambiando a Publer...")
-            return cls._download_with_publer(full_thread_url, save_path)
+            return await cls._download_with_publer(full_thread_url, save_path)
@@ -1,9 +1,9 @@
 import os
 import re
 import logging
-import requests
 from fastapi import HTTPException
 from urllib.parse import quote
+from services.HttpClientService import HttpClientService
 
 # Configure logging
 logging.basicConfig(
@@ -58,7 +58,7 @@ class TiktokService:
     }
 
     @classmethod
-    def download_video_with_requests(cls, tiktok_url: str, save_path: str) -> str:
+    async def download_video_with_requests(cls, tiktok_url: str, save_path: str) -> str:
         """
         Downloads TikTok video using the savetik.net API as a fallback method.
         Returns the path to the saved video file.
@@ -76,7 +76,7 @@ class TiktokService:
         logger.debug(f"[SAVETIK] Request headers: {cls.HEADERS}")
 
         try:
-            response = requests.get(
+            response = await HttpClientService.get(
                 cls.SAVETIK_API_URL, headers=cls.HEADERS, params=params
             )
             logger.info(f"[SAVETIK] Response status code: {response.status_code}")
@@ -115,35 +115,19 @@ class TiktokService:
             logger.error("[SAVETIK] No download URL found in response")
             raise DownloadError("No download URL available")
 
-        # Download the video
+        # Download the video content to save_path
         logger.info(f"[SAVETIK] Starting video download from: {download_url}")
         try:
-            video_response = requests.get(
+            total_size = await HttpClientService.download(
                 download_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
             )
-            logger.info(
-                f"[SAVETIK] Video response status: {video_response.status_code}"
-            )
-            video_response.raise_for_status()
+            logger.info(f"[SAVETIK] Downloaded video size: {total_size} bytes")
         except Exception as e:
             logger.error(f"[SAVETIK] Error downloading video: {str(e)}")
             raise DownloadError("Error downloading video")
 
-        # Save the video content to save_path
-        try:
-            with open(save_path, "wb") as f:
-                total_size = 0
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        total_size += len(chunk)
-                        f.write(chunk)
-            logger.info(f"[SAVETIK] Downloaded video size: {total_size} bytes")
-        except Exception as e:
-            logger.error(f"[SAVETIK] Error saving video file: {str(e)}")
-            raise DownloadError("Error saving video file")
-
         # Verify file size is valid (at least 10KB for a video)
         if os.path.exists(save_path):
             file_size = os.path.getsize(save_path)
@@ -156,7 +140,7 @@ class TiktokService:
         return save_path
 
     @classmethod
-    def get_video_url(cls, tiktok_url: str) -> str:
+    async def get_video_url(cls, tiktok_url: str) -> str:
         """
         Gets the direct video URL from a TikTok URL.
         Tries multiple services in order if one fails.
@@ -175,22 +159,21 @@ class TiktokService:
                 
                 # Try tnktok first with short code
                 try:
-                    return cls._get_video_url_tnktok_short(short_code)
+                    return await cls._get_video_url_tnktok_short(short_code)
                 except Exception as e:
                     logger.error(f"[GET_URL] TNKTOK with short code failed: {e}")
 
         # Resolve redirect from vm.tiktok.com if needed
         if "vm.tiktok.com" in tiktok_url:
             try:
-                response = requests.get(
+                response = await HttpClientService.get(
                     tiktok_url,
                     headers={
                         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:147.0) Gecko/20100101 Firefox/147.0",
                     },
-                    allow_redirects=True,
                     timeout=30,
                 )
-                final_url = response.url
+                final_url = str(response.url)
                 logger.info(f"[GET_URL] Resolved redirect to: {final_url}")
                 tiktok_url = final_url
             except Exception as e:
@@ -201,21 +184,21 @@ class TiktokService:
 
         # Method 1: TNKTOK (vt.tnktok.com) with full URL
         try:
-            return cls._get_video_url_tnktok(tiktok_url)
+            return await cls._get_video_url_tnktok(tiktok_url)
         except Exception as e:
             logger.error(f"[GET_URL] TNKTOK failed: {e}")
             last_error = e
 
         # Method 2: Savetik
         try:
-            return cls._get_video_url_savetik(tiktok_url)
+            return await cls._get_video_url_savetik(tiktok_url)
         except Exception as e:
             logger.error(f"[GET_URL] Savetik failed: {e}")
             last_error = e
 
         # Method 3: SnapTik
         try:
-            return cls._get_video_url_snaptik(tiktok_url)
+            return await cls._get_video_url_snaptik(tiktok_url)
         except Exception as e:
             logger.error(f"[GET_URL] SnapTik failed: {e}")
             last_error = e
@@ -223,7 +206,7 @@ class TiktokService:
         raise DownloadError(f"All methods failed. Last error: {last_error}")
 
     @classmethod
-    def _get_video_url_savetik(cls, tiktok_url: str) -> str:
+    async def _get_video_url_savetik(cls, tiktok_url: str) -> str:
         """Get video URL using Savetik API"""
         params = {"url": tiktok_url}
         headers = {
@@ -235,7 +218,7 @@ class TiktokService:
             "Referer": "https://savetik.net/es",
         }
 
-        response = requests.get(
+        response = await HttpClientService.get(
             cls.SAVETIK_API_URL, headers=headers, params=params, timeout=30
         )
         response.raise_for_status()
@@ -257,7 +240,7 @@ class TiktokService:
         return download_url
 
     @classmethod
-    def _get_video_url_snaptik(cls, tiktok_url: str) -> str:
+    async def _get_video_url_snaptik(cls, tiktok_url: str) -> str:
         """Get video URL using SnapTik API"""
         params = {"url": tiktok_url}
         headers = {
@@ -266,7 +249,7 @@ class TiktokService:
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-        response = requests.post(
+        response = await HttpClientService.post(
             cls.SNAPTT_API_URL, headers=headers, data=params, timeout=30
         )
         response.raise_for_status()
@@ -290,7 +273,7 @@ class TiktokService:
         return download_url
 
     @classmethod
-    def _get_video_url_tnktok(cls, tiktok_url: str) -> str:
+    async def _get_video_url_tnktok(cls, tiktok_url: str) -> str:
         """Get video URL using TNKTOK (vt.tnktok.com)"""
         # Extract video ID from URL
         video_id = None
@@ -304,7 +287,7 @@ class TiktokService:
         # Use @/video/{id} format
         tnktok_url = f"{cls.TNKTOK_URL}/@/video/{video_id}"
 
-        response = requests.get(
+        response = await HttpClientService.get(
             tnktok_url,
             headers={
                 "User-Agent": "curl/8.5.0",
@@ -325,11 +308,11 @@ class TiktokService:
         return download_url
 
     @classmethod
-    def _get_video_url_tnktok_short(cls, short_code: str) -> str:
+    async def _get_video_url_tnktok_short(cls, short_code: str) -> str:
         """Get video URL using TNKTOK with short code (vt.tnktok.com/shortcode)"""
         tnktok_url = f"{cls.TNKTOK_URL}/{short_code}"
 
-        response = requests.get(
+        response = await HttpClientService.get(
             tnktok_url,
             headers={
                 "User-Agent": "curl/8.5.0",
@@ -350,7 +333,7 @@ class TiktokService:
         return download_url
 
     @classmethod
-    def download_video_with_tnktok(cls, tiktok_url: str, save_path: str) -> str:
+    async def download_video_with_tnktok(cls, tiktok_url: str, save_path: str) -> str:
         """
         Downloads TikTok video using vt.tnktok.com as first fallback.
         Returns the path to the saved video file.
@@ -370,7 +353,7 @@ class TiktokService:
         logger.info(f"[TNKTOK] Request URL: {tnktok_url}")
 
         try:
-            response = requests.get(
+            response = await HttpClientService.get(
                 tnktok_url,
                 headers={
                     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:147.0) Gecko/20100101 Firefox/147.0",
@@ -402,10 +385,10 @@ class TiktokService:
             logger.error("[TNKTOK] No download URL found in metatag")
             raise DownloadError("No download URL available")
 
-        return cls._download_video_file(download_url, save_path)
+        return await cls._download_video_file(download_url, save_path)
 
     @classmethod
-    def download_video_with_alternative_api(
+    async def download_video_with_alternative_api(
         cls, tiktok_url: str, save_path: str
     ) -> str:
         """
@@ -418,20 +401,20 @@ class TiktokService:
 
         # Try snapTik API first
         try:
-            return cls._download_via_snaptik(tiktok_url, save_path)
+            return await cls._download_via_snaptik(tiktok_url, save_path)
         except Exception as snap_e:
             logger.error(f"[ALT] snapTik API failed: {snap_e}")
 
         # Try ttdownloader API as second alternative
         try:
-            return cls._download_via_ttdownloader(tiktok_url, save_path)
+            return await cls._download_via_ttdownloader(tiktok_url, save_path)
         except Exception as ttd_e:
             logger.error(f"[ALT] ttdownloader API failed: {ttd_e}")
 
         raise DownloadError("All TikTok download methods failed")
 
     @classmethod
-    def _download_via_snaptik(cls, tiktok_url: str, save_path: str) -> str:
+    async def _download_via_snaptik(cls, tiktok_url: str, save_path: str) -> str:
         """
         Download video using snapTik.app API.
         """
@@ -442,7 +425,7 @@ class TiktokService:
         logger.debug(f"[SNAPTIK] Request headers: {cls.SNAPTt_HEADERS}")
 
         try:
-            response = requests.post(
+            response = await HttpClientService.post(
                 cls.SNAPTT_API_URL,
                 data={"url": tiktok_url},
                 headers=cls.SNAPTt_HEADERS,
@@ -491,10 +474,10 @@ class TiktokService:
             logger.error("[SNAPTIK] No download URL found in response")
             raise VideoNotFoundError("Video not found")
 
-        return cls._download_video_file(download_url, save_path)
+        return await cls._download_video_file(download_url, save_path)
 
     @classmethod
-    def _download_via_ttdownloader(cls, tiktok_url: str, save_path: str) -> str:
+    async def _download_via_ttdownloader(cls, tiktok_url: str, save_path: str) -> str:
         """
         Download video using ttdownloader.com API.
         """
@@ -505,7 +488,7 @@ class TiktokService:
         logger.debug(f"[TTDOWNLOADER] Request headers: {cls.SNAPTt_HEADERS}")
 
         try:
-            response = requests.post(
+            response = await HttpClientService.post(
                 cls.TTDOWN_API_URL,
                 data={"url": tiktok_url},
                 headers=cls.SNAPTt_HEADERS,
@@ -539,10 +522,10 @@ class TiktokService:
             logger.error("[TTDOWNLOADER] No download URL found in response")
             raise VideoNotFoundError("Video not found")
 
-        return cls._download_video_file(download_url, save_path)
+        return await cls._download_video_file(download_url, save_path)
 
     @classmethod
-    def _download_video_file(cls, download_url: str, save_path: str) -> str:
+    async def _download_video_file(cls, download_url: str, save_path: str) -> str:
         """
         Helper method to download video from a URL and save to file.
         """
@@ -550,31 +533,17 @@ class TiktokService:
         logger.debug(f"[VIDEO] Save path: {save_path}")
 
         try:
-            video_response = requests.get(
+            total_size = await HttpClientService.download(
                 download_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
                 timeout=120,  # Longer timeout for videos
             )
-            logger.info(f"[VIDEO] Response status code: {video_response.status_code}")
-            logger.debug(f"[VIDEO] Response headers: {dict(video_response.headers)}")
-            video_response.raise_for_status()
+            logger.info(f"[VIDEO] Downloaded video size: {total_size} bytes")
         except Exception as e:
             logger.error(f"[VIDEO] Error downloading video from URL: {str(e)}")
             raise DownloadError("Error downloading video")
 
-        try:
-            with open(save_path, "wb") as f:
-                total_size = 0
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        total_size += len(chunk)
-                        f.write(chunk)
-            logger.info(f"[VIDEO] Downloaded video size: {total_size} bytes")
-        except Exception as e:
-            logger.error(f"[VIDEO] Error saving video file: {str(e)}")
-            raise DownloadError("Error saving video file")
-
         # Verify file size is valid (at least 10KB for a video)
         if os.path.exists(save_path):
             file_size = os.path.getsize(save_path)
@@ -1,6 +1,6 @@
 import os
 import re
-import requests
+from services.HttpClientService import HttpClientService
 
 
 class VideoNotFoundError(Exception):
@@ -23,7 +23,7 @@ class XService:
     }
 
     @classmethod
-    def get_video_url(cls, x_id: str) -> str:
+    async def get_video_url(cls, x_id: str) -> str:
         """
         Gets the direct video URL from an X (Twitter) post ID.
         Returns the direct video URL without downloading.
@@ -33,7 +33,7 @@ class XService:
         print(f"[GET_URL] Request URL: {url}")
 
         try:
-            response = requests.get(url, headers=cls.HEADERS, timeout=30)
+            response = await HttpClientService.get(url, headers=cls.HEADERS, timeout=30)
             print(f"[GET_URL] Response status code: {response.status_code}")
             response.raise_for_status()
         except Exception as e:
@@ -78,7 +78,7 @@ class XService:
         return download_url
 
     @classmethod
-    def download_video_with_fxtwitter(cls, x_id: str, save_path: str) -> str:
+    async def download_video_with_fxtwitter(cls, x_id: str, save_path: str) -> str:
         """
         Downloads X (Twitter) video using fxtwitter.com as fallback.
         Makes a request to https://fxtwitter.com/i/status/{id} and extracts
@@ -94,7 +94,7 @@ class XService:
         print(f"[FXTWITTER] Request URL: {url}")
 
         try:
-            response = requests.get(url, headers=cls.HEADERS, timeout=30)
+            response = await HttpClientService.get(url, headers=cls.HEADERS, timeout=30)
             print(f"[FXTWITTER] Response status code: {response.status_code}")
             response.raise_for_status()
         except Exception as e:
@@ -142,31 +142,17 @@ class XService:
 
         # Download the video
         try:
-            video_response = requests.get(
+            total_size = await HttpClientService.download(
                 download_url,
+                save_path,
                 headers={"User-Agent": cls.HEADERS["User-Agent"]},
-                stream=True,
                 timeout=120,
             )
-            print(f"[FXTWITTER] Video response status: {video_response.status_code}")
-            video_response.raise_for_status()
+            print(f"[FXTWITTER] Downloaded video size: {total_size} bytes")
         except Exception as e:
             print(f"[FXTWITTER] Error downloading video: {e}")
             raise DownloadError("Error downloading video")
 
-        # Save the video
-        try:
-            with open(save_path, "wb") as f:
-                total_size = 0
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        total_size += len(chunk)
-                        f.write(chunk)
-            print(f"[FXTWITTER] Downloaded video size: {total_size} bytes")
-        except Exception as e:
-            print(f"[FXTWITTER] Error saving video file: {e}")
-            raise DownloadError("Error saving video file")
-
         # Verify file size is valid (at least 10KB for a video)
         if os.path.exists(save_path):
             file_size = os.path.getsize(save_path)
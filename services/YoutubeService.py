@@ -1,9 +1,9 @@
 import os
 import re
-import requests
-import yt_dlp
-import asyncio
 from typing import Optional, Dict, Any
+from services.ExecutorService import ExecutorService
+from services.YtdlpService import YtdlpService
+from services.HttpClientService import HttpClientService
 
 
 class VideoNotFoundError(Exception):
@@ -24,6 +24,7 @@ class YoutubeService:
         "https://iv.1d4.us",
     ]
     DURATION_THRESHOLD_SECONDS = 480
+    WATCH_URL = "https://www.youtube.com/watch?v={}"
     HEADERS = {
         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:147.0) Gecko/20100101 Firefox/147.0",
         "Accept": "application/json, text/plain, */*",
@@ -32,11 +33,19 @@ class YoutubeService:
         "Sec-GPC": "1",
         "Connection": "keep-alive",
     }
+    PAGE_HEADERS = {
+        **HEADERS,
+        "Accept": "text/html,application/xhtml+xml",
+        # Skips the EU cookie consent interstitial
+        "Cookie": "SOCS=CAI",
+    }
 
     @classmethod
-    def _get_video_info_invidious(cls, instance: str, video_id: str) -> Dict[str, Any]:
+    async def _get_video_info_invidious(
+        cls, instance: str, video_id: str
+    ) -> Dict[str, Any]:
         url = f"{instance}/api/v1/videos/{video_id}"
-        response = requests.get(url, headers=cls.HEADERS, timeout=30)
+        response = await HttpClientService.get(url, headers=cls.HEADERS, timeout=30)
         response.raise_for_status()
         data = response.json()
         if data.get("error"):
@@ -44,8 +53,8 @@ class YoutubeService:
         return data
 
     @classmethod
-    def _get_stream_url_from_invidious(cls, instance: str, video_id: str) -> str:
-        data = cls._get_video_info_invidious(instance, video_id)
+    async def _get_stream_url_from_invidious(cls, instance: str, video_id: str) -> str:
+        data = await cls._get_video_info_invidious(instance, video_id)
         format_streams = data.get("formatStreams") or []
         adaptive_formats = data.get("adaptiveFormats") or []
         all_formats = format_streams + adaptive_formats
@@ -63,21 +72,12 @@ class YoutubeService:
     @classmethod
     async def _get_video_info_yt_dlp(cls, video_id: str) -> Dict[str, Any]:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, cls._extract_yt_dlp_info, url)
+        return await ExecutorService.run("y", cls._extract_yt_dlp_info, url)
 
     @classmethod
-    def _extract_yt_dlp_info(cls, url: str) -> Dict[str, Any]:
-        ydl_opts = {
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-            "geo_bypass": True,
-            "nocheckcertificate": True,
-            "prefer_insecure": True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            return ydl.extract_info(url, download=False)
+    async def _extract_yt_dlp_info(cls, url: str) -> Dict[str, Any]:
+        # Same profile as the stream lookup, so one extraction answers both
+        return await YtdlpService.extract_info("youtube_stream", url)
 
     @classmethod
     async def get_video_info(cls, video_id: str) -> Dict[str, Any]:
@@ -88,7 +88,9 @@ class YoutubeService:
 
         for instance in cls.INVIDIOUS_INSTANCES:
             try:
-                data = cls._get_video_info_invidious(instance, video_id)
+                data = await ExecutorService.run(
+                    "y", cls._get_video_info_invidious, instance, video_id
+                )
                 if data:
                     return data
             except Exception:
@@ -96,8 +98,55 @@ class YoutubeService:
 
         raise DownloadError("All methods failed")
 
+    @classmethod
+    async def probe(cls, video_id: str) -> Dict[str, Any]:
+        """
+        Duration and availability from a single fetch of the watch page,
+        without yt-dlp. Returns {"duration": seconds, "status": "OK"}.
+        Raises VideoNotFoundError if YouTube reports the video unavailable,
+        DownloadError if the page can't be read or the video can't be played.
+        """
+        response = await HttpClientService.get(
+            cls.WATCH_URL.format(video_id), headers=cls.PAGE_HEADERS, timeout=15
+        )
+        response.raise_for_status()
+        return cls._parse_watch_page(response.text, video_id)
+
+    @classmethod
+    def _parse_watch_page(cls, html: str, video_id: str) -> Dict[str, Any]:
+        status = re.search(r'"playabilityStatus":\{"status":"(\w+)"', html)
+        if status is None:
+            raise DownloadError("No player response in watch page")
+        if status.group(1) == "ERROR":
+            raise VideoNotFoundError("Video unavailable")
+        if status.group(1) != "OK":
+            # LOGIN_REQUIRED, UNPLAYABLE, LIVE_STREAM_OFFLINE...
+            raise DownloadError(f"Video not playable: {status.group(1)}")
+
+        # Related videos come later in the page; read this video's details
+        details = html.find(f'"videoDetails":{{"videoId":"{video_id}"')
+        length = None
+        if details >= 0:
+            length = re.compile(r'"lengthSeconds":"(\d+)"').search(html, details)
+        if length is None:
+            raise DownloadError("No duration in watch page")
+        return {"duration": int(length.group(1)), "status": "OK"}
+
     @classmethod
     async def get_duration(cls, video_id: str) -> int:
+        """
+        Seconds the video lasts, 0 if unknown. Only falls back to a full
+        extraction when the watch page can't answer.
+        Raises VideoNotFoundError if the video doesn't exist.
+        """
+        try:
+            info = await ExecutorService.run("y", cls.probe, video_id)
+            return info["duration"]
+        except VideoNotFoundError:
+            raise
+        except Exception:
+            pass
+
         info = await cls.get_video_info(video_id)
         length = info.get("lengthSeconds")
         if length is not None:
@@ -110,48 +159,37 @@ class YoutubeService:
         return 0
 
     @classmethod
-    def _get_stream_url_yt_dlp(cls, video_id: str) -> str:
+    async def _get_stream_url_yt_dlp(cls, video_id: str) -> str:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        ydl_opts = {
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-            "geo_bypass": True,
-            "nocheckcertificate": True,
-            "prefer_insecure": True,
-            "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if not info:
-                raise DownloadError("No info returned from yt-dlp")
-
-            direct_url = info.get("url") or ""
-            if direct_url and not direct_url.startswith("https://i.ytimg.com/sb/"):
-                return direct_url
-
-            formats = info.get("formats") or []
-            for fmt in formats:
-                fmt_url = fmt.get("url") or ""
-                if fmt_url and not fmt_url.startswith("https://i.ytimg.com/sb/"):
-                    return fmt_url
-
-            if direct_url:
-                return direct_url
-
-            raise DownloadError("No valid stream URL from yt-dlp")
+        info = await YtdlpService.extract_info("youtube_stream", url)
+
+        direct_url = info.get("url") or ""
+        if direct_url and not direct_url.startswith("https://i.ytimg.com/sb/"):
+            return direct_url
+
+        formats = info.get("formats") or []
+        for fmt in formats:
+            fmt_url = fmt.get("url") or ""
+            if fmt_url and not fmt_url.startswith("https://i.ytimg.com/sb/"):
+                return fmt_url
+
+        if direct_url:
+            return direct_url
+
+        raise DownloadError("No valid stream URL from yt-dlp")
 
     @classmethod
     async def get_stream_url(cls, video_id: str) -> str:
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stream_url_yt_dlp, video_id)
+            return await ExecutorService.run("y", cls._get_stream_url_yt_dlp, video_id)
         except Exception:
             pass
 
         for instance in cls.INVIDIOUS_INSTANCES:
             try:
-                url = cls._get_stream_url_from_invidious(instance, video_id)
+                url = await ExecutorService.run(
+                    "y", cls._get_stream_url_from_invidious, instance, video_id
+                )
                 if url:
                     return url
             except Exception:
@@ -161,9 +199,8 @@ class YoutubeService:
 
     @classmethod
     async def download_video(cls, video_id: str, save_path: str) -> str:
-        loop = asyncio.get_event_loop()
         try:
-            await loop.run_in_executor(None, cls._download_yt_dlp, video_id, save_path)
+            await ExecutorService.run("y", cls._download_yt_dlp, video_id, save_path)
             if os.path.exists(save_path) and os.path.getsize(save_path) > 10240:
                 return save_path
         except Exception:
@@ -171,9 +208,11 @@ class YoutubeService:
 
         for instance in cls.INVIDIOUS_INSTANCES:
             try:
-                stream_url = cls._get_stream_url_from_invidious(instance, video_id)
+                stream_url = await ExecutorService.run(
+                    "y", cls._get_stream_url_from_invidious, instance, video_id
+                )
                 if stream_url and not stream_url.startswith("https://i.ytimg.com/sb/"):
-                    cls._download_file(stream_url, save_path)
+                    await ExecutorService.run("y", cls._download_file, stream_url, save_path)
                     if os.path.exists(save_path) and os.path.getsize(save_path) > 10240:
                         return save_path
             except Exception:
@@ -182,30 +221,23 @@ class YoutubeService:
         raise DownloadError("Download failed with all methods")
 
     @classmethod
-    def _download_file(cls, url: str, save_path: str) -> str:
-        response = requests.get(url, headers=cls.HEADERS, stream=True, timeout=120)
-        response.raise_for_status()
-        with open(save_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+    async def _download_file(cls, url: str, save_path: str) -> str:
+        await HttpClientService.download(
+            url, save_path, headers=cls.HEADERS, timeout=120
+        )
         return save_path
 
     @classmethod
-    def _download_yt_dlp(cls, video_id: str, save_path: str) -> None:
+    async def _download_yt_dlp(cls, video_id: str, save_path: str) -> None:
         url = f"https://www.youtube.com/watch?v={video_id}"
         directory = os.path.dirname(save_path)
         filename_without_ext = os.path.splitext(os.path.basename(save_path))[0]
-        ydl_opts = {
-            "outtmpl": os.path.join(directory, f"{filename_without_ext}.%(ext)s"),
-            "quiet": True,
-            "no_warnings": True,
-            "geo_bypass": True,
-            "nocheckcertificate": True,
-            "prefer_insecure": True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=True)
+        await YtdlpService.extract_info(
+            "youtube",
+            url,
+            download=True,
+            outtmpl=os.path.join(directory, f"{filename_without_ext}.%(ext)s"),
+        )
 
         expected_ext = "mp4"
         actual_path = os.path.join(directory, f"{filename_without_ext}.{expected_ext}")
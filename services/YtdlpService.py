@@ -0,0 +1,395 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+import multiprocessing
+import yt_dlp
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Tuple, Set
+from services.CacheService import CacheService
+from services.DirectUrlService import DirectUrlService
+
+
+class DownloadError(Exception):
+    """Excepción cuando falla la extracción o descarga con yt-dlp"""
+
+    pass
+
+
+# Warm YoutubeDL instances of the current worker process, one per profile
+_instances: Dict[str, yt_dlp.YoutubeDL] = {}
+
+
+class _JobTimeout(BaseException):
+    """Raised in a worker when its job runs out of time; yt-dlp can't catch it."""
+
+    pass
+
+
+def _on_alarm(signum, frame) -> None:
+    raise _JobTimeout()
+
+
+def _init_worker(profiles: Dict[str, Dict[str, Any]]) -> None:
+    for name, opts in profiles.items():
+        _instances[name] = yt_dlp.YoutubeDL(dict(opts))
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _run_job(
+    profile: str,
+    url: str,
+    download: bool,
+    outtmpl: Optional[str],
+    info: Optional[Dict[str, Any]] = None,
+    timeout: int = 0,
+) -> Dict[str, Any]:
+    ydl = _instances[profile]
+    templates = ydl.params["outtmpl"]
+    previous = templates.get("default")
+    if outtmpl:
+        templates["default"] = outtmpl
+    # Interrupts the job, not the worker, once it has run for timeout seconds
+    signal.alarm(timeout)
+    try:
+        if info is not None:
+            # Downloads from an earlier extraction without extracting again
+            info = ydl.process_ie_result(info, download=download)
+        else:
+            info = ydl.extract_info(url, download=download)
+        if not info:
+            raise DownloadError("No info returned from yt-dlp")
+        return ydl.sanitize_info(info)
+    except DownloadError:
+        raise
+    except _JobTimeout:
+        raise DownloadError(f"yt-dlp job timed out after {timeout}s") from None
+    except Exception as e:
+        # yt-dlp errors carry tracebacks that can't cross the process boundary
+        raise DownloadError(str(e)) from None
+    finally:
+        signal.alarm(0)
+        templates["default"] = previous
+
+
+class YtdlpService:
+    """
+    Pool of long-lived worker processes that run yt-dlp extract/download
+    jobs. Each worker keeps a warm YoutubeDL instance per option profile, so
+    extractor setup is paid once per process and page/JSON parsing scales
+    across cores. A job that runs past JOB_TIMEOUT is interrupted inside
+    its worker, which stays in the pool. A worker that is still stuck
+    JOB_KILL_GRACE seconds later has its pool retired: new jobs go to a
+    fresh pool, the retired one finishes the jobs it already has, and only
+    then are its processes killed. A crashed worker breaks its pool, which
+    is rebuilt; the API process keeps serving either way.
+
+    Metadata lookups are cached per profile and URL for METADATA_TTL
+    seconds, or until the chosen format's URL expires if that is sooner,
+    so one extraction answers every later question about a video. The
+    cache keeps only the fields callers use (see summarize); a fresh
+    extraction still returns the full info dict, which download() can
+    use to download without extracting again.
+    """
+
+    MAX_WORKERS = int(os.getenv("YTDLP_WORKERS", os.cpu_count() or 2))
+    # Seconds a single job may run before it is interrupted
+    JOB_TIMEOUT = int(os.getenv("YTDLP_JOB_TIMEOUT", "180"))
+    # Further seconds before a worker that ignores the interrupt is given up on
+    JOB_KILL_GRACE = int(os.getenv("YTDLP_JOB_KILL_GRACE", "30"))
+    # Workers kept free of downloads so metadata lookups never queue behind them
+    RESERVED_WORKERS = int(os.getenv("YTDLP_RESERVED_WORKERS", "1"))
+    METADATA_TTL = float(os.getenv("YTDLP_METADATA_TTL", "600"))
+    METADATA_SIZE = int(os.getenv("YTDLP_METADATA_SIZE", "2048"))
+    SUMMARY_FIELDS = ("id", "ext", "duration", "title", "webpage_url", "url")
+
+    BASE_OPTS = {
+        "quiet": True,
+        "no_warnings": True,
+    }
+
+    PROFILES = {
+        "default": BASE_OPTS,
+        "tiktok": {
+            **BASE_OPTS,
+            "extractor_retries": 3,
+            "fragment_retries": 3,
+            "skip_unavailable_fragments": False,
+            "nocheckcertificate": True,
+            "prefer_insecure": True,
+            "geo_bypass": True,
+        },
+        "youtube": {
+            **BASE_OPTS,
+            "geo_bypass": True,
+            "nocheckcertificate": True,
+            "prefer_insecure": True,
+        },
+        "youtube_stream": {
+            **BASE_OPTS,
+            "skip_download": True,
+            "geo_bypass": True,
+            "nocheckcertificate": True,
+            "prefer_insecure": True,
+            "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+        },
+    }
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    # Pool -> its jobs that have not finished yet
+    _jobs: Dict[ProcessPoolExecutor, Set[Future]] = {}
+    _lock = threading.Lock()
+    # One per worker process, so submitted jobs start right away and
+    # their deadline never includes time spent queued in the executor
+    _slots: Optional[asyncio.Semaphore] = None
+    _download_slots: Optional[asyncio.Semaphore] = None
+    # (profile, url) -> (monotonic expiry, summary)
+    _metadata: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = (
+        OrderedDict()
+    )
+    restarts = 0
+    metadata_hits = 0
+    metadata_misses = 0
+
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=cls.MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(cls.PROFILES,),
+                )
+                cls._jobs[cls._pool] = set()
+            return cls._pool
+
+    @classmethod
+    def _discard_pool(cls, pool: ProcessPoolExecutor) -> None:
+        with cls._lock:
+            if cls._pool is pool:
+                cls._pool = None
+                cls.restarts += 1
+            cls._jobs.pop(pool, None)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _retire_pool(cls, pool: ProcessPoolExecutor, stuck: Future) -> None:
+        """
+        Stops sending jobs to pool, whose worker running stuck does not
+        respond, and kills its processes once its other jobs are done.
+        Killing any worker earlier would break the whole pool.
+        """
+        with cls._lock:
+            if cls._pool is pool:
+                cls._pool = None
+                cls.restarts += 1
+            jobs = list(cls._jobs.get(pool, ()))
+        others = [job for job in jobs if job is not stuck]
+        pool.shutdown(wait=False)
+
+        def reap(_=None) -> None:
+            if not all(job.done() for job in others):
+                return
+            with cls._lock:
+                if cls._jobs.pop(pool, None) is None:
+                    return
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+
+        for job in others:
+            job.add_done_callback(reap)
+        reap()
+
+    @classmethod
+    def _download_workers(cls) -> int:
+        """Workers downloads may use; all of them if none can be reserved."""
+        if cls.MAX_WORKERS <= cls.RESERVED_WORKERS:
+            return cls.MAX_WORKERS
+        return cls.MAX_WORKERS - cls.RESERVED_WORKERS
+
+    @classmethod
+    def start(cls) -> None:
+        """Spawns the workers ahead of the first request."""
+        if cls.MAX_WORKERS <= cls.RESERVED_WORKERS:
+            print(
+                f"Warning: YTDLP_WORKERS={cls.MAX_WORKERS} leaves no worker for "
+                f"downloads besides the {cls.RESERVED_WORKERS} reserved for "
+                "metadata lookups; reservation is off, so lookups can queue "
+                "behind downloads"
+            )
+        pool = cls._get_pool()
+        for _ in range(cls.MAX_WORKERS):
+            pool.submit(_warm_up)
+
+    @classmethod
+    async def extract_info(
+        cls,
+        profile: str,
+        url: str,
+        download: bool = False,
+        outtmpl: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs extract_info in a worker process and awaits its result.
+        Returns the sanitized info dict, or its cached summary.
+        Raises DownloadError on failure, timeout or worker crash.
+        """
+        if not download:
+            cached = cls._metadata.get((profile, url))
+            if cached is not None and cached[0] > time.monotonic():
+                cls.metadata_hits += 1
+                return cached[1]
+            cls.metadata_misses += 1
+            info_dict = await cls._submit(profile, url, download, outtmpl)
+            cls._remember(profile, url, info_dict)
+            return info_dict
+
+        return await cls._download(profile, url, outtmpl)
+
+    @classmethod
+    async def download(
+        cls,
+        profile: str,
+        url: str,
+        info: Optional[Dict[str, Any]] = None,
+        outtmpl: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Downloads url. info is an earlier extract_info result for it; if it
+        is a full info dict rather than a cached summary, the worker
+        downloads from it without extracting again.
+        Raises DownloadError on failure, timeout or worker crash.
+        """
+        # Summaries lack what yt-dlp needs to download (extractor, headers)
+        if info is None or info.get("_summary") or "extractor" not in info:
+            info = None
+        return await cls._download(profile, url, outtmpl, info)
+
+    @classmethod
+    async def _download(
+        cls,
+        profile: str,
+        url: str,
+        outtmpl: Optional[str],
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if cls._download_slots is None:
+            cls._download_slots = asyncio.Semaphore(cls._download_workers())
+        async with cls._download_slots:
+            info_dict = await cls._submit(profile, url, True, outtmpl, info)
+        CacheService.fetched(f"yt-dlp:{profile}")
+        return info_dict
+
+    @classmethod
+    def summarize(cls, info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The fields of an info dict callers use: SUMMARY_FIELDS, the chosen
+        formats (url and ext only) and the summaries of any entries.
+        Summaries are marked with a "_summary" key.
+        """
+        summary = {field: info.get(field) for field in cls.SUMMARY_FIELDS}
+        summary["_summary"] = True
+        formats = info.get("requested_formats") or []
+        if not formats and not info.get("url"):
+            formats = info.get("formats") or []
+        summary["formats"] = [
+            {"url": f.get("url"), "ext": f.get("ext")} for f in formats if f.get("url")
+        ]
+        if info.get("entries"):
+            summary["entries"] = [
+                cls.summarize(entry) for entry in info["entries"] if entry
+            ]
+        return summary
+
+    @classmethod
+    def _remember(cls, profile: str, url: str, info: Dict[str, Any]) -> None:
+        summary = cls.summarize(info)
+        ttl = cls.METADATA_TTL
+        chosen = summary["url"] or next((f["url"] for f in summary["formats"]), None)
+        expires = DirectUrlService.expiry(chosen) if chosen else None
+        if expires is not None:
+            # Signed format URLs must still work when they are used
+            ttl = min(ttl, expires - time.time() - DirectUrlService.MARGIN)
+        if ttl <= 0:
+            return
+        cls._metadata[(profile, url)] = (time.monotonic() + ttl, summary)
+        cls._metadata.move_to_end((profile, url))
+        while len(cls._metadata) > cls.METADATA_SIZE:
+            cls._metadata.popitem(last=False)
+
+    @classmethod
+    async def _submit(
+        cls,
+        profile: str,
+        url: str,
+        download: bool,
+        outtmpl: Optional[str],
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if cls._slots is None:
+            cls._slots = asyncio.Semaphore(cls.MAX_WORKERS)
+        async with cls._slots:
+            return await cls._run(profile, url, download, outtmpl, info)
+
+    @classmethod
+    async def _run(
+        cls,
+        profile: str,
+        url: str,
+        download: bool,
+        outtmpl: Optional[str],
+        info: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        pool = cls._get_pool()
+        try:
+            future = pool.submit(
+                _run_job, profile, url, download, outtmpl, info, cls.JOB_TIMEOUT
+            )
+        except (BrokenProcessPool, RuntimeError) as e:
+            cls._discard_pool(pool)
+            raise DownloadError(f"yt-dlp worker pool unavailable: {e}")
+        jobs = cls._jobs.get(pool)
+        if jobs is not None:
+            jobs.add(future)
+            future.add_done_callback(jobs.discard)
+
+        try:
+            # The worker interrupts the job itself after JOB_TIMEOUT
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout=cls.JOB_TIMEOUT + cls.JOB_KILL_GRACE,
+            )
+        except asyncio.TimeoutError:
+            # Holding a slot, the job had a worker of its own: it is stuck
+            cls._retire_pool(pool, future)
+            raise DownloadError(f"yt-dlp job timed out after {cls.JOB_TIMEOUT}s")
+        except BrokenProcessPool as e:
+            cls._discard_pool(pool)
+            raise DownloadError(f"yt-dlp worker crashed: {e}")
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "restarts": cls.restarts,
+            "metadata_cached": len(cls._metadata),
+            "metadata_hits": cls.metadata_hits,
+            "metadata_misses": cls.metadata_misses,
+        }
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._lock:
+            pool, cls._pool = cls._pool, None
+            cls._jobs.pop(pool, None)
+        # Semaphores belong to the event loop that is shutting down
+        cls._slots = cls._download_slots = None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import httpx
+
+CHUNK = 64 * 1024
+CHUNKS = 24
+CHUNK_DELAY = 0.1
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """
+    Serves clip.mp4 a chunk at a time, like a slow CDN. The first GET is
+    yt-dlp's extraction; streaming is set once the download's is under way.
+    """
+
+    requests = 0
+
+    def __init__(self, *args, streaming=None, **kwargs):
+        self.streaming = streaming
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(CHUNK * CHUNKS))
+        self.end_headers()
+        SlowHandler.requests += 1
+        download = SlowHandler.requests > 1
+        try:
+            for n in range(CHUNKS):
+                self.wfile.write(b"\0" * CHUNK)
+                if download and n == 2:
+                    self.streaming.set()
+                time.sleep(CHUNK_DELAY)
+        except OSError:
+            # The extraction only reads the first bytes
+            pass
+
+
+def serve(streaming):
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(SlowHandler, streaming=streaming)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_slow_download_does_not_delay_cache_hit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import main
+    from services.AliasService import AliasService
+    from services.RateLimitService import RateLimitService
+
+    monkeypatch.setattr(RateLimitService, "ENABLED", False)
+    streaming = threading.Event()
+    server = serve(streaming)
+    slow_url = f"http://127.0.0.1:{server.server_port}/clip.mp4"
+    # Every short code resolves to the slow server
+    monkeypatch.setattr(main, "get_tiktok_url", lambda tiktok_id: slow_url)
+
+    async def run():
+        await main.startup_event()
+        try:
+            with open(main.video_path("t", "7498636088018210070"), "wb") as f:
+                f.write(os.urandom(2 * 1024 * 1024))
+            await AliasService.remember("t", "ZNd5tth8o", "7498636088018210070")
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test", timeout=60
+            ) as client:
+                cold = asyncio.create_task(client.get("/ZZslowcod"))
+                while not streaming.is_set():
+                    assert not cold.done(), cold.result()
+                    await asyncio.sleep(0.01)
+
+                started = time.perf_counter()
+                hit = await client.get("/ZNd5tth8o")
+                latency = time.perf_counter() - started
+
+                assert hit.status_code == 200
+                assert len(hit.content) == 2 * 1024 * 1024
+                assert not cold.done(), "the slow download finished first"
+                assert latency < 0.5, f"cache hit took {latency:.3f} s"
+
+                response = await cold
+                assert response.status_code == 200
+                assert len(response.content) == CHUNK * CHUNKS
+        finally:
+            await main.shutdown_event()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
@@ -0,0 +1,47 @@
+import os
+import asyncio
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from services.YtdlpService import YtdlpService
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory):
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=directory)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_cached_summary_still_downloads(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    body = os.urandom(200_000)
+    (served / "clip.mp4").write_bytes(body)
+    server = serve(str(served))
+    url = f"http://127.0.0.1:{server.server_port}/clip.mp4"
+    outtmpl = str(tmp_path / "out" / "%(id)s.%(ext)s")
+
+    async def run():
+        fresh = await YtdlpService.extract_info("default", url)
+        cached = await YtdlpService.extract_info("default", url)
+        assert "_summary" not in fresh
+        assert cached["_summary"] and cached["id"] == fresh["id"]
+
+        # A summary can't be downloaded from; it has to extract again
+        await YtdlpService.download("default", url, cached, outtmpl)
+
+    try:
+        asyncio.run(run())
+    finally:
+        YtdlpService.shutdown()
+        server.shutdown()
+
+    assert (tmp_path / "out" / "clip.mp4").read_bytes() == body
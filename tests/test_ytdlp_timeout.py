@@ -0,0 +1,90 @@
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from services.YtdlpService import YtdlpService, DownloadError
+
+
+class DelayedHandler(BaseHTTPRequestHandler):
+    """Answers /<seconds>.mp4 with a small video after that many seconds."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(float(self.path.strip("/").split(".")[0]))
+        body = b"\0" * 4096
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+
+def test_timeout_only_fails_the_stuck_job(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DelayedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(YtdlpService, "MAX_WORKERS", 2)
+
+    async def run():
+        # Both workers up before timing anything
+        await asyncio.gather(
+            YtdlpService.extract_info("default", f"{base}/0.mp4?a"),
+            YtdlpService.extract_info("default", f"{base}/0.mp4?b"),
+        )
+        restarts = YtdlpService.restarts
+        monkeypatch.setattr(YtdlpService, "JOB_TIMEOUT", 3)
+
+        stuck = asyncio.ensure_future(
+            YtdlpService.extract_info("default", f"{base}/30.mp4")
+        )
+        await asyncio.sleep(1.5)
+        # Still running on the other worker when the stuck job times out
+        healthy = await YtdlpService.extract_info("default", f"{base}/2.mp4")
+        assert healthy["ext"] == "mp4"
+
+        with pytest.raises(DownloadError, match="timed out"):
+            await stuck
+        # The interrupted worker is reused
+        assert (await YtdlpService.extract_info("default", f"{base}/0.mp4?c"))["ext"]
+        assert YtdlpService.restarts == restarts
+
+    try:
+        asyncio.run(run())
+    finally:
+        YtdlpService.shutdown()
+        server.shutdown()
+
+
+def test_queued_jobs_get_the_whole_timeout(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DelayedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(YtdlpService, "MAX_WORKERS", 1)
+    monkeypatch.setattr(YtdlpService, "JOB_KILL_GRACE", 0)
+
+    async def run():
+        await YtdlpService.extract_info("default", f"{base}/0.mp4?a")
+        restarts = YtdlpService.restarts
+        monkeypatch.setattr(YtdlpService, "JOB_TIMEOUT", 4)
+
+        # The second job waits for the only worker; that is not its time
+        results = await asyncio.gather(
+            YtdlpService.extract_info("default", f"{base}/3.mp4?a"),
+            YtdlpService.extract_info("default", f"{base}/3.mp4?b"),
+        )
+        assert [info["ext"] for info in results] == ["mp4", "mp4"]
+        assert YtdlpService.restarts == restarts
+
+    try:
+        asyncio.run(run())
+    finally:
+        YtdlpService.shutdown()
+        server.shutdown()